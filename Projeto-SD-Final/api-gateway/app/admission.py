@@ -0,0 +1,148 @@
+from collections import OrderedDict
+import math
+import os
+import time
+
+from prometheus_client import Counter, Gauge
+from starlette.routing import compile_path
+
+from app.workers import GATEWAY_WORKERS
+
+# ---------------- CONFIG ----------------
+
+# 0 desativa o limite correspondente
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "256"))
+RATE_LIMIT_CLIENT = float(os.getenv("RATE_LIMIT_CLIENT", "50"))
+RATE_LIMIT_CLIENT_BURST = float(os.getenv("RATE_LIMIT_CLIENT_BURST", "100"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+# "rota=rate:burst,..." com rotas no formato FastAPI, por exemplo
+# "/api/orders/batch=5:10,/api/orders/{order_id}/full=100:200"
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "")
+
+# O limite global e os limites por rota são do gateway inteiro e cada worker
+# fica com a sua parte. O limite por cliente fica por worker: com keep-alive
+# um cliente tende a ficar sempre no mesmo worker.
+WORKER_MAX_IN_FLIGHT = math.ceil(ADMISSION_MAX_IN_FLIGHT / GATEWAY_WORKERS)
+
+# nunca rejeitados (probes do load balancer e scrapes do Prometheus)
+ADMISSION_EXEMPT = {"/metrics", "/api/health"}
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+SHED_TOTAL = Counter(
+    "api_gateway_shed_total",
+    "Requests rejeitados pelo controlo de admissão do API Gateway",
+    ["reason"]
+)
+
+IN_FLIGHT = Gauge(
+    "api_gateway_in_flight_requests",
+    "Requests em curso no API Gateway",
+    multiprocess_mode="livesum"
+)
+
+# ---------------- TOKEN BUCKET ----------------
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # devolve 0 se havia token, senão os segundos até haver um
+    def take(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def parse_route_limits(spec: str):
+    limits = []
+    for item in filter(None, (i.strip() for i in spec.split(","))):
+        route, _, rate_spec = item.partition("=")
+        rate, _, burst = rate_spec.partition(":")
+        regex, _, _ = compile_path(route)
+        limits.append((
+            route,
+            regex,
+            float(rate) / GATEWAY_WORKERS,
+            max(1.0, float(burst or rate) / GATEWAY_WORKERS)
+        ))
+    return limits
+
+# ---------------- ADMISSION ----------------
+
+class Rejection:
+    __slots__ = ("status", "reason", "retry_after")
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# Limite global de requests em curso + token buckets por cliente e por rota.
+# O que passa os limites é rejeitado logo (429/503), em vez de ficar em fila.
+class AdmissionController:
+    def __init__(self):
+        self.in_flight = 0
+        self._clients = OrderedDict()
+        self._routes = [
+            (route, regex, TokenBucket(rate, burst))
+            for route, regex, rate, burst in parse_route_limits(RATE_LIMIT_ROUTES)
+        ]
+
+    def _client_bucket(self, client: str) -> TokenBucket:
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(RATE_LIMIT_CLIENT, RATE_LIMIT_CLIENT_BURST)
+            if len(self._clients) > RATE_LIMIT_MAX_CLIENTS:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return bucket
+
+    def _check(self, client: str, path: str):
+        if path in ADMISSION_EXEMPT:
+            return None
+
+        if WORKER_MAX_IN_FLIGHT and self.in_flight >= WORKER_MAX_IN_FLIGHT:
+            return Rejection(503, "overloaded", 1.0)
+
+        for _, regex, bucket in self._routes:
+            if regex.match(path):
+                wait = bucket.take()
+                if wait:
+                    return Rejection(429, "route_rate_limited", wait)
+                break
+
+        if RATE_LIMIT_CLIENT:
+            wait = self._client_bucket(client).take()
+            if wait:
+                return Rejection(429, "client_rate_limited", wait)
+
+        return None
+
+    # None = admitido (e conta como em curso até release())
+    def admit(self, client: str, path: str):
+        rejection = self._check(client, path)
+        if rejection is not None:
+            SHED_TOTAL.labels(reason=rejection.reason).inc()
+            return rejection
+
+        self.in_flight += 1
+        IN_FLIGHT.set(self.in_flight)
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+        IN_FLIGHT.set(self.in_flight)
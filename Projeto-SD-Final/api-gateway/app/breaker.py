@@ -0,0 +1,123 @@
+from collections import deque
+import os
+import time
+
+from prometheus_client import Gauge
+
+# ---------------- CONFIG ----------------
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "2.0"))
+BREAKER_SLOW_CALL_RATE = float(os.getenv("BREAKER_SLOW_CALL_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "10.0"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "3"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+CIRCUIT_STATE = Gauge(
+    "api_gateway_circuit_state",
+    "Estado do circuit breaker por serviço (0=closed, 1=open, 2=half_open)",
+    ["upstream"],
+    multiprocess_mode="livemax"
+)
+
+# ---------------- CIRCUIT BREAKER ----------------
+
+class CircuitOpenError(Exception):
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"circuit open for {upstream}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+# Abre quando, numa janela das últimas chamadas, a taxa de erros ou de
+# chamadas lentas passa o limite. Depois de BREAKER_OPEN_SECONDS deixa passar
+# algumas chamadas de teste (half-open) antes de voltar a fechar.
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.opened_at = 0.0
+
+        self._calls = deque(maxlen=BREAKER_WINDOW)
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+
+        CIRCUIT_STATE.labels(upstream=name).set(STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(upstream=self.name).set(STATE_VALUES[state])
+
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._half_open_in_flight = 0
+            self._half_open_successes = 0
+        elif state == CLOSED:
+            self._calls.clear()
+
+    # usado pelo balanceamento para saltar réplicas sem chamar before_call()
+    @property
+    def available(self) -> bool:
+        if self.state == OPEN:
+            return time.monotonic() >= self.opened_at + BREAKER_OPEN_SECONDS
+        if self.state == HALF_OPEN:
+            return self._half_open_in_flight < BREAKER_HALF_OPEN_CALLS
+        return True
+
+    def before_call(self):
+        if self.state == OPEN:
+            remaining = self.opened_at + BREAKER_OPEN_SECONDS - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._half_open_in_flight >= BREAKER_HALF_OPEN_CALLS:
+                raise CircuitOpenError(self.name, BREAKER_OPEN_SECONDS)
+            self._half_open_in_flight += 1
+
+    def on_success(self, latency: float):
+        if self.state == HALF_OPEN:
+            self._half_open_in_flight -= 1
+            if latency >= BREAKER_SLOW_CALL_SECONDS:
+                self._set_state(OPEN)
+                return
+            self._half_open_successes += 1
+            if self._half_open_successes >= BREAKER_HALF_OPEN_CALLS:
+                self._set_state(CLOSED)
+        elif self.state == CLOSED:
+            self._record(error=False, slow=latency >= BREAKER_SLOW_CALL_SECONDS)
+
+    def on_failure(self):
+        if self.state == HALF_OPEN:
+            self._set_state(OPEN)
+        elif self.state == CLOSED:
+            self._record(error=True, slow=False)
+
+    def on_cancel(self):
+        # chamada abandonada pelo cliente: não conta como sucesso nem erro
+        if self.state == HALF_OPEN:
+            self._half_open_in_flight -= 1
+
+    def _record(self, error: bool, slow: bool):
+        self._calls.append((error, slow))
+
+        total = len(self._calls)
+        if total < BREAKER_MIN_CALLS:
+            return
+
+        errors = sum(1 for e, _ in self._calls if e)
+        slow_calls = sum(1 for _, s in self._calls if s)
+
+        if errors / total >= BREAKER_ERROR_RATE or slow_calls / total >= BREAKER_SLOW_CALL_RATE:
+            self._set_state(OPEN)
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+import os
+import time
+
+from prometheus_client import Counter, Gauge
+
+from app.workers import state_path
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+CACHE_HITS = Counter(
+    "api_gateway_cache_hits_total",
+    "Respostas servidas pela cache do API Gateway",
+    ["route"]
+)
+
+CACHE_MISSES = Counter(
+    "api_gateway_cache_misses_total",
+    "Pedidos que não encontraram entrada válida na cache do API Gateway",
+    ["route"]
+)
+
+CACHE_EVICTIONS = Counter(
+    "api_gateway_cache_evictions_total",
+    "Entradas removidas da cache do API Gateway",
+    ["route", "reason"]
+)
+
+CACHE_REVALIDATIONS = Counter(
+    "api_gateway_cache_revalidations_total",
+    "Entradas expiradas revalidadas com If-None-Match junto do serviço",
+    ["route", "result"]
+)
+
+CACHE_ENTRIES = Gauge(
+    "api_gateway_cache_entries",
+    "Número de entradas na cache do API Gateway",
+    multiprocess_mode="livesum"
+)
+
+# ---------------- CACHE ----------------
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "etag")
+
+    def __init__(self, body: bytes, media_type: str, etag: str = None):
+        self.body = body
+        self.media_type = media_type
+        self.etag = etag
+
+
+# Com vários workers cada um tem a sua cache; as invalidações são
+# propagadas pelo mtime de um ficheiro por rota no GATEWAY_STATE_DIR.
+def invalidation_marker(route: str):
+    return state_path("cache-invalidated" + route.replace("/", "_"))
+
+def invalidated_since(route: str, stored_at: int) -> bool:
+    path = invalidation_marker(route)
+    if path is None:
+        return False
+    try:
+        return os.stat(path).st_mtime_ns >= stored_at
+    except FileNotFoundError:
+        return False
+
+def mark_invalidated(route: str):
+    path = invalidation_marker(route)
+    if path is None:
+        return
+    now = time.time_ns()
+    with open(path, "a"):
+        pass
+    os.utime(path, ns=(now, now))
+
+
+# Cache TTL + LRU limitada a max_entries. As chaves são (rota, query string),
+# para que a invalidação possa ser feita por rota. Entradas expiradas ficam
+# até saírem por LRU, para serem revalidadas com If-None-Match (stale()).
+class TTLCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, route: str, key: str):
+        entry = self._entries.get((route, key))
+        if entry is None:
+            CACHE_MISSES.labels(route=route).inc()
+            return None
+
+        expires_at, stored_at, value = entry
+        if invalidated_since(route, stored_at):
+            del self._entries[(route, key)]
+            CACHE_EVICTIONS.labels(route=route, reason="invalidated").inc()
+            CACHE_MISSES.labels(route=route).inc()
+            CACHE_ENTRIES.set(len(self._entries))
+            return None
+
+        if expires_at <= time.monotonic():
+            if value.etag is None:
+                del self._entries[(route, key)]
+                CACHE_EVICTIONS.labels(route=route, reason="expired").inc()
+                CACHE_ENTRIES.set(len(self._entries))
+            CACHE_MISSES.labels(route=route).inc()
+            return None
+
+        self._entries.move_to_end((route, key))
+        CACHE_HITS.labels(route=route).inc()
+        return value
+
+    def stale(self, route: str, key: str):
+        entry = self._entries.get((route, key))
+        if entry is None or entry[2].etag is None:
+            return None
+        return entry[2]
+
+    def set(self, route: str, key: str, value, ttl: float):
+        if ttl <= 0:
+            return
+
+        self._entries[(route, key)] = (time.monotonic() + ttl, time.time_ns(), value)
+        self._entries.move_to_end((route, key))
+
+        while len(self._entries) > self.max_entries:
+            (evicted_route, _), _ = self._entries.popitem(last=False)
+            CACHE_EVICTIONS.labels(route=evicted_route, reason="lru").inc()
+
+        CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, *routes: str):
+        for route in routes:
+            mark_invalidated(route)
+
+        for entry_key in [k for k in self._entries if k[0] in routes]:
+            del self._entries[entry_key]
+            CACHE_EVICTIONS.labels(route=entry_key[0], reason="invalidated").inc()
+
+        CACHE_ENTRIES.set(len(self._entries))
@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+import time
+
+import orjson
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from prometheus_client import Counter, Gauge
+
+# ---------------- CONFIG ----------------
+
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "1.0"))
+SSE_PAGE_SIZE = int(os.getenv("SSE_PAGE_SIZE", "1000"))
+SSE_CLIENT_BUFFER = int(os.getenv("SSE_CLIENT_BUFFER", "256"))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15.0"))
+SSE_REPLAY_LIMIT = int(os.getenv("SSE_REPLAY_LIMIT", "1000"))
+# quanto tempo se espera por um id em falta (transação ainda sem commit)
+# antes de desistir dele (rollback, ou transação demasiado longa)
+SSE_GAP_TIMEOUT = float(os.getenv("SSE_GAP_TIMEOUT", "10.0"))
+SSE_MAX_GAPS = int(os.getenv("SSE_MAX_GAPS", "10000"))
+
+logger = logging.getLogger("api-gateway")
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+SSE_SUBSCRIBERS = Gauge(
+    "api_gateway_sse_subscribers",
+    "Clientes ligados aos streams SSE do API Gateway",
+    ["feed"],
+    multiprocess_mode="livesum"
+)
+
+SSE_EVENTS = Counter(
+    "api_gateway_sse_events_total",
+    "Eventos enviados pelos streams SSE (por cliente)",
+    ["feed"]
+)
+
+SSE_EVICTIONS = Counter(
+    "api_gateway_sse_evictions_total",
+    "Clientes SSE desligados por não acompanharem o stream",
+    ["feed"]
+)
+
+SSE_GAPS = Counter(
+    "api_gateway_sse_gaps_total",
+    "Ids em falta vistos pelos streams SSE (commits fora de ordem)",
+    ["feed", "result"]
+)
+
+SSE_POLLS = Counter(
+    "api_gateway_sse_polls_total",
+    "Pedidos feitos ao serviço pelo poller de cada stream SSE",
+    ["feed", "result"]
+)
+
+# ---------------- SUBSCRIBERS ----------------
+
+class Subscriber:
+    __slots__ = ("queue", "evicted")
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=SSE_CLIENT_BUFFER)
+        self.evicted = False
+
+    def push(self, item) -> bool:
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            self.evicted = True
+            return False
+
+# ---------------- FEED ----------------
+
+def sse_event(event: str, data, event_id=None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + orjson.dumps(data) + b"\n\n"
+
+# Um único poller por feed (e por worker) segue o cursor after_id do serviço
+# e distribui os itens novos por todos os clientes ligados, seja qual for o
+# número de clientes. Cada cliente tem um buffer limitado; quem o enche é
+# desligado e pode voltar a ligar com Last-Event-ID.
+#
+# Os ids (serial do Postgres, réplicas, bulk inserts) não fazem commit pela
+# ordem em que são atribuídos: o id N pode aparecer depois do N+1. Os ids
+# saltados ficam em gaps e o poller relê a partir do mais antigo até ele
+# aparecer ou passarem SSE_GAP_TIMEOUT segundos. O id de cada evento SSE é um
+# low watermark (tudo até ele já foi enviado), por isso um Last-Event-ID pode
+# repetir eventos, mas não perde os que chegaram fora de ordem; os clientes
+# deduplicam pelo id dos dados.
+class ChangeFeed:
+    def __init__(self, name: str, service, path: str):
+        self.name = name
+        self.service = service
+        self.path = path
+        self.subscribers = set()
+        # maior id já distribuído; None até o poller saber onde começar
+        self.cursor = None
+        # ids abaixo do cursor ainda por aparecer -> quando se deu pela falta
+        self.gaps = {}
+        self._ready = asyncio.Event()
+        self._task = None
+
+    # tudo até aqui já foi distribuído (ou desistiu-se de esperar)
+    @property
+    def watermark(self) -> int:
+        return min(self.gaps) - 1 if self.gaps else self.cursor
+
+    # ---------------- POLLER ----------------
+
+    async def _latest_id(self) -> int:
+        r = await self.service.get(self.path, params={"limit": 1})
+        r.raise_for_status()
+        return r.json()["last_id"]
+
+    async def _poll(self):
+        etag = None
+        while True:
+            try:
+                if self.cursor is None:
+                    self.cursor = await self._latest_id()
+                    self._ready.set()
+
+                self._expire_gaps()
+                after_id = self.watermark
+                while True:
+                    # com If-None-Match um feed parado custa um 304 sem corpo
+                    r = await self.service.get(
+                        self.path,
+                        params={"after_id": after_id, "limit": SSE_PAGE_SIZE},
+                        headers={"If-None-Match": etag} if etag else None
+                    )
+                    if r.status_code == 304:
+                        SSE_POLLS.labels(feed=self.name, result="not_modified").inc()
+                        break
+                    r.raise_for_status()
+                    SSE_POLLS.labels(feed=self.name, result="modified").inc()
+
+                    page = r.json()
+                    self._apply(page["data"])
+
+                    # o ETag é da coleção inteira: só serve depois da última página
+                    if not page.get("next_cursor"):
+                        etag = r.headers.get("etag")
+                        break
+                    etag = None
+                    after_id = page["data"][-1]["id"]
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                SSE_POLLS.labels(feed=self.name, result="error").inc()
+                logger.warning(f"Change feed {self.name} poll failed: {e}")
+                etag = None
+
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+
+    # Uma página lida a partir do watermark: distribui os ids em falta que
+    # apareceram e os acima do cursor, e ignora os já distribuídos.
+    def _apply(self, items):
+        now = time.monotonic()
+        fresh = []
+        for item in items:
+            item_id = item["id"]
+            if item_id in self.gaps:
+                del self.gaps[item_id]
+                SSE_GAPS.labels(feed=self.name, result="filled").inc()
+            elif item_id > self.cursor:
+                self._track_gaps(self.cursor + 1, item_id, now)
+                self.cursor = item_id
+            else:
+                continue
+            fresh.append(item)
+
+        # a página vem por ordem de id: quando um item chega ao cliente, os ids
+        # menores até ao watermark já lá estão
+        watermark = self.watermark
+        for item in fresh:
+            self.publish(item, min(watermark, item["id"]))
+
+    def _track_gaps(self, start: int, stop: int, now: float):
+        missing = stop - start
+        if missing <= 0:
+            return
+        if len(self.gaps) + missing > SSE_MAX_GAPS:
+            SSE_GAPS.labels(feed=self.name, result="untracked").inc(missing)
+            logger.warning(f"Change feed {self.name}: not waiting for {missing} missing ids before {stop}")
+            return
+        for gap_id in range(start, stop):
+            self.gaps[gap_id] = now
+
+    def _expire_gaps(self):
+        deadline = time.monotonic() - SSE_GAP_TIMEOUT
+        expired = [gap_id for gap_id, seen in self.gaps.items() if seen < deadline]
+        for gap_id in expired:
+            del self.gaps[gap_id]
+        if expired:
+            SSE_GAPS.labels(feed=self.name, result="expired").inc(len(expired))
+
+    def publish(self, item, event_id: int):
+        for subscriber in list(self.subscribers):
+            if not subscriber.push((item, event_id)):
+                self.subscribers.discard(subscriber)
+                SSE_EVICTIONS.labels(feed=self.name).inc()
+                SSE_SUBSCRIBERS.labels(feed=self.name).set(len(self.subscribers))
+
+    async def stop(self):
+        # o estado é limpo antes do await: quem subscrever entretanto já
+        # encontra _task a None e arranca um poller novo
+        task, self._task = self._task, None
+        self.cursor = None
+        self.gaps = {}
+        self._ready.clear()
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    # ---------------- SUBSCRIPTIONS ----------------
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber()
+        self.subscribers.add(subscriber)
+        SSE_SUBSCRIBERS.labels(feed=self.name).set(len(self.subscribers))
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+        return subscriber
+
+    async def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        SSE_SUBSCRIBERS.labels(feed=self.name).set(len(self.subscribers))
+        if not self.subscribers:
+            await self.stop()
+
+    # Itens perdidos desde Last-Event-ID, lidos diretamente do serviço até ao
+    # cursor do poller; os seguintes chegam pela subscrição.
+    async def _replay(self, after_id: int, until_id: int):
+        items = []
+        while after_id < until_id and len(items) < SSE_REPLAY_LIMIT:
+            r = await self.service.get(
+                self.path,
+                params={"after_id": after_id, "limit": min(SSE_PAGE_SIZE, SSE_REPLAY_LIMIT - len(items))}
+            )
+            r.raise_for_status()
+            page = r.json()
+            items.extend(item for item in page["data"] if item["id"] <= until_id)
+            if not page["data"] or not page.get("next_cursor"):
+                break
+            after_id = page["data"][-1]["id"]
+        return items, after_id < until_id and len(items) >= SSE_REPLAY_LIMIT
+
+    async def _events(self, after_id):
+        # subscreve antes do replay para não perder itens entretanto criados
+        subscriber = self.subscribe()
+        # ids do replay, que também podem chegar pela subscrição
+        replayed = set()
+        event_id = None
+        try:
+            yield b"retry: 3000\n\n"
+
+            if after_id is not None:
+                while not self._ready.is_set():
+                    try:
+                        await asyncio.wait_for(self._ready.wait(), SSE_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        yield b": ping\n\n"
+
+                # lido antes do replay: tudo até ao watermark já está na base de dados
+                watermark = self.watermark
+                items, truncated = await self._replay(after_id, self.cursor)
+                for item in items:
+                    replayed.add(item["id"])
+                    event_id = min(watermark, item["id"])
+                    SSE_EVENTS.labels(feed=self.name).inc()
+                    yield sse_event(self.name, item, event_id)
+                if truncated:
+                    yield sse_event("truncated", {"after_id": items[-1]["id"]})
+
+            while not subscriber.evicted:
+                try:
+                    item, event_id = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+
+                if item["id"] in replayed:
+                    continue
+                SSE_EVENTS.labels(feed=self.name).inc()
+                yield sse_event(self.name, item, event_id)
+
+            yield sse_event("evicted", {"last_event_id": event_id})
+        finally:
+            await self.unsubscribe(subscriber)
+
+    def response(self, request: Request) -> StreamingResponse:
+        after_id = request.headers.get("last-event-id") or request.query_params.get("after_id")
+        try:
+            after_id = int(after_id) if after_id else None
+        except ValueError:
+            after_id = None
+
+        return StreamingResponse(
+            self._events(after_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
@@ -0,0 +1,158 @@
+from collections import deque
+from datetime import datetime
+import asyncio
+import logging
+import os
+import time
+
+from prometheus_client import Gauge
+
+from app.workers import LeaderLock, read_json, state_path, write_json
+
+# ---------------- CONFIG ----------------
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "5.0"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "2.0"))
+HEALTH_WINDOW = int(os.getenv("HEALTH_WINDOW", "20"))
+
+logger = logging.getLogger("api-gateway")
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+UPSTREAM_UP = Gauge(
+    "api_gateway_upstream_up",
+    "Resultado do último health check por serviço (1=online, 0=degraded/offline)",
+    ["upstream"],
+    multiprocess_mode="livemin"
+)
+
+# ---------------- HEALTH STATE ----------------
+
+def percentile(values, p: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+class ServiceHealth:
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.status = "unknown"
+        self.latencies = deque(maxlen=HEALTH_WINDOW)
+        self.history = deque(maxlen=HEALTH_WINDOW)
+        self._snapshot = {"service": upstream.url, "status": "unknown"}
+
+    @property
+    def is_up(self) -> bool:
+        # antes do primeiro probe assume-se que o serviço está disponível
+        return self.status in ("online", "unknown")
+
+    def record(self, status: str, latency_ms=None, error=None):
+        self.status = status
+        self.history.append(status)
+        if latency_ms is not None:
+            self.latencies.append(latency_ms)
+
+        self.upstream.healthy = self.is_up
+        UPSTREAM_UP.labels(upstream=self.upstream.name).set(1 if status == "online" else 0)
+
+        # o snapshot é calculado aqui para o /api/health só ter de o ler
+        snapshot = {
+            "service": self.upstream.url,
+            "status": status,
+            "latency_ms": latency_ms,
+            "latency_p50_ms": percentile(self.latencies, 0.50),
+            "latency_p95_ms": percentile(self.latencies, 0.95),
+            "uptime_ratio": round(self.history.count("online") / len(self.history), 3),
+            "history": list(self.history),
+            "checked_at": datetime.now().isoformat(),
+        }
+        if error is not None:
+            snapshot["error"] = error
+        self._snapshot = snapshot
+
+    # estado publicado pelo worker que faz os probes
+    def load(self, snapshot: dict):
+        self.status = snapshot["status"]
+        self._snapshot = snapshot
+        self.upstream.healthy = self.is_up
+        UPSTREAM_UP.labels(upstream=self.upstream.name).set(1 if self.status == "online" else 0)
+
+    def snapshot(self) -> dict:
+        return {**self._snapshot, "circuit": self.upstream.breaker.state}
+
+# ---------------- PROBER ----------------
+
+# Task de fundo que faz health check a cada serviço a cada
+# HEALTH_PROBE_INTERVAL segundos e guarda o resultado em memória.
+# Com vários workers só o que tem o LeaderLock faz os probes; publica o
+# estado num ficheiro partilhado que os restantes leem.
+class HealthProber:
+    def __init__(self, upstreams):
+        self.services = {u.name: ServiceHealth(u) for u in upstreams}
+        self._task = None
+        self._leader = LeaderLock("health.lock")
+        self._state_file = state_path("health.json")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._leader.release()
+
+    async def _run(self):
+        while True:
+            if self._leader.acquire():
+                await self.probe_all()
+                self._publish()
+            else:
+                self._load()
+            await asyncio.sleep(HEALTH_PROBE_INTERVAL)
+
+    def _publish(self):
+        if self._state_file is not None:
+            write_json(self._state_file, {
+                name: s._snapshot for name, s in self.services.items()
+            })
+
+    def _load(self):
+        state = read_json(self._state_file) or {}
+        for name, snapshot in state.items():
+            if name in self.services:
+                self.services[name].load(snapshot)
+
+    async def probe_all(self):
+        await asyncio.gather(*[self.probe(s) for s in self.services.values()])
+
+    # O probe vai direto ao client, sem passar pelo circuit breaker: o /health
+    # dos serviços não toca na BD, por isso os seus sucessos não podem fechar
+    # um circuito aberto por erros reais, e um circuito aberto não pode
+    # impedir o probe.
+    async def probe(self, service: ServiceHealth):
+        upstream = service.upstream
+        try:
+            if upstream.client is None:
+                await upstream.start()
+            start = time.perf_counter()
+            r = await upstream.client.get("/health", timeout=HEALTH_PROBE_TIMEOUT)
+            latency = int((time.perf_counter() - start) * 1000)
+            service.record("online" if r.status_code == 200 else "degraded", latency)
+        except Exception as e:
+            if service.status != "offline":
+                logger.warning(f"Service {upstream.name} is offline: {e}")
+            service.record("offline", error=str(e))
+
+    def is_up(self, name: str) -> bool:
+        return self.services[name].is_up
+
+    def snapshot(self) -> list:
+        return [s.snapshot() for s in self.services.values()]
@@ -0,0 +1,84 @@
+from collections import deque
+import os
+
+from prometheus_client import Counter
+
+# ---------------- CONFIG ----------------
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.005"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+
+# cada request deposita RETRY_BUDGET_RATIO tokens; hedges e retries gastam 1
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+RETRY_BUDGET_MAX = float(os.getenv("RETRY_BUDGET_MAX", "10"))
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+HEDGED_REQUESTS = Counter(
+    "api_gateway_hedged_requests_total",
+    "Pedidos duplicados (hedge) por o primeiro passar do p95 do serviço",
+    ["upstream"]
+)
+
+HEDGE_WINS = Counter(
+    "api_gateway_hedge_wins_total",
+    "Hedges que responderam antes do pedido original",
+    ["upstream"]
+)
+
+RETRIES = Counter(
+    "api_gateway_retries_total",
+    "Retries de GETs idempotentes após erro do serviço",
+    ["upstream"]
+)
+
+RETRY_BUDGET_EXHAUSTED = Counter(
+    "api_gateway_retry_budget_exhausted_total",
+    "Hedges/retries não feitos por falta de orçamento",
+    ["upstream"]
+)
+
+# ---------------- LATENCY WINDOW ----------------
+
+# Latências das últimas respostas; o quantil é recalculado a cada
+# HEDGE_MIN_SAMPLES amostras, não em cada pedido.
+class LatencyWindow:
+    def __init__(self):
+        self._samples = deque(maxlen=LATENCY_WINDOW)
+        self._since_update = 0
+        self._quantile = None
+
+    def observe(self, latency: float):
+        self._samples.append(latency)
+        self._since_update += 1
+        if self._since_update >= HEDGE_MIN_SAMPLES:
+            ordered = sorted(self._samples)
+            self._quantile = ordered[int(HEDGE_QUANTILE * (len(ordered) - 1))]
+            self._since_update = 0
+
+    def hedge_delay(self):
+        if not HEDGE_ENABLED or self._quantile is None:
+            return None
+        return max(HEDGE_MIN_DELAY, self._quantile)
+
+# ---------------- RETRY BUDGET ----------------
+
+# Limita hedges + retries a uma fração do tráfego, para não multiplicarem
+# a carga sobre um serviço que já está em dificuldades.
+class RetryBudget:
+    def __init__(self, name: str):
+        self.name = name
+        self.tokens = RETRY_BUDGET_MAX
+
+    def deposit(self):
+        self.tokens = min(RETRY_BUDGET_MAX, self.tokens + RETRY_BUDGET_RATIO)
+
+    def withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        RETRY_BUDGET_EXHAUSTED.labels(upstream=self.name).inc()
+        return False
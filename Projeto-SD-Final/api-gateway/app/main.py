@@ -1,7 +1,12 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import Response
-import httpx
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 import asyncio
+import httpx
+import ipaddress
+import math
+import os
 import time
 
 from prometheus_client import (
@@ -11,7 +16,16 @@ from prometheus_client import (
     CONTENT_TYPE_LATEST
 )
 
-app = FastAPI(title="API Gateway")
+from app.admission import AdmissionController
+from app.breaker import CircuitOpenError
+from app.cache import CACHE_REVALIDATIONS, CachedResponse, TTLCache
+from app.feeds import ChangeFeed
+from app.health import HealthProber
+from app.responses import CompressionMiddleware, FastJSONResponse, etag_matches
+from app.singleflight import SingleFlight
+from app.tracing import TRACER, TracingMiddleware
+from app.routing import RoutingTable, Service, load_routing_table
+from app.workers import mark_worker_dead, metrics_registry
 
 # ---------------- PROMETHEUS METRICS ----------------
 
@@ -27,136 +41,508 @@ REQUEST_LATENCY = Histogram(
     ["method", "path"]
 )
 
+# A label "path" é o template da rota FastAPI (/api/orders/{order_id}/full),
+# não o path do pedido, para o número de séries não crescer com ids ou scans.
+MAX_PATH_LABELS = int(os.getenv("METRICS_MAX_PATH_LABELS", "100"))
+UNMATCHED_PATH = "__unmatched__"
+OVERFLOW_PATH = "__overflow__"
+
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+_path_labels = set()
+_metric_children = {}
+
+def path_label(request: Request) -> str:
+    route = request.scope.get("route")
+    if route is not None:
+        path = route.path
+    elif request.scope.get("endpoint") is not None:
+        path = request.url.path
+    else:
+        return UNMATCHED_PATH
+
+    if path not in _path_labels:
+        if len(_path_labels) >= MAX_PATH_LABELS:
+            return OVERFLOW_PATH
+        _path_labels.add(path)
+    return path
+
+def observe_request(method: str, path: str, status: int, duration: float):
+    # .labels() é resolvido uma vez por combinação e guardado
+    key = (method, path, status)
+    children = _metric_children.get(key)
+    if children is None:
+        children = _metric_children[key] = (
+            REQUESTS_TOTAL.labels(method=method, path=path, status=status),
+            REQUEST_LATENCY.labels(method=method, path=path),
+        )
+
+    children[0].inc()
+    children[1].observe(duration)
+
 # ---------------- SERVICES ----------------
 
-ORDERS_URL = "http://orders:5001"
-PAYMENTS_URL = "http://payments:5002"
-LOGS_URL = "http://logs:5003"
-NOTIFICATIONS_URL = "http://notifications:5004"
-METRICAS_URL = "http://metricas:5005"
+# réplicas, balanceamento e timeouts por rota vêm da tabela de routing
+# (GATEWAY_ROUTES_FILE ou <SERVIÇO>_URL, ver app/routing.py)
+ROUTING = RoutingTable(load_routing_table())
+
+ORDERS = ROUTING.service("orders")
+PAYMENTS = ROUTING.service("payments")
+LOGS = ROUTING.service("logs")
+NOTIFICATIONS = ROUTING.service("notifications")
+METRICAS = ROUTING.service("metricas")
+
+COMPOSITE_DEADLINE = float(os.getenv("COMPOSITE_DEADLINE", "2.0"))
 
 SERVICES = [
-    ORDERS_URL,
-    PAYMENTS_URL,
-    LOGS_URL,
-    NOTIFICATIONS_URL,
-    METRICAS_URL,
+    ORDERS,
+    PAYMENTS,
+    LOGS,
+    NOTIFICATIONS,
+    METRICAS,
 ]
 
+HEALTH = HealthProber(ROUTING.replicas())
+
+# streams SSE de itens novos (ver app/feeds.py)
+ORDERS_FEED = ChangeFeed("orders", ORDERS, "/orders")
+NOTIFICATIONS_FEED = ChangeFeed("notifications", NOTIFICATIONS, "/notifications")
+
+# ---------------- APP ----------------
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for service in SERVICES:
+        await service.start()
+    TRACER.start()
+    HEALTH.start()
+    yield
+    await HEALTH.stop()
+    await ORDERS_FEED.stop()
+    await NOTIFICATIONS_FEED.stop()
+    for service in SERVICES:
+        await service.close()
+    mark_worker_dead()
+
+app = FastAPI(
+    title="API Gateway",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
+)
+
+# adicionado antes do prometheus_middleware, que fica por fora e inclui
+# o tempo de compressão na latência
+app.add_middleware(CompressionMiddleware)
+
+# ---------------- UPSTREAM ERRORS ----------------
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    return FastJSONResponse(
+        status_code=503,
+        content={
+            "error": "circuit_open",
+            "upstream": exc.upstream,
+            "retry_after": round(exc.retry_after, 3),
+        },
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+@app.exception_handler(httpx.HTTPStatusError)
+async def upstream_status_handler(request: Request, exc: httpx.HTTPStatusError):
+    status = exc.response.status_code
+    return FastJSONResponse(
+        status_code=status if status < 500 else 502,
+        content={
+            "error": "upstream_error",
+            "upstream": str(exc.request.url),
+            "status": status,
+        }
+    )
+
+@app.exception_handler(httpx.TransportError)
+async def upstream_unreachable_handler(request: Request, exc: httpx.TransportError):
+    timeout = isinstance(exc, httpx.TimeoutException)
+    return FastJSONResponse(
+        status_code=504 if timeout else 502,
+        content={
+            "error": "upstream_timeout" if timeout else "upstream_unreachable",
+            "upstream": str(exc.request.url),
+            "detail": str(exc),
+        }
+    )
+
+# ---------------- STREAMING ----------------
+
+# Rotas (separadas por vírgula) servidas em modo passthrough: o corpo do
+# serviço é reenviado em chunks, sem json() nem cache.
+STREAM_ROUTES = {r for r in os.getenv("STREAM_ROUTES", "").split(",") if r}
+
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+
+def conditional_headers(request: Request) -> dict:
+    return {h: request.headers[h] for h in CONDITIONAL_HEADERS if h in request.headers}
+
+async def stream_get(route: str, request: Request, upstream: Service, path: str, params=None):
+    r = await upstream.request(
+        "GET",
+        path,
+        stream=True,
+        params=request.query_params if params is None else params,
+        timeout=ROUTING.timeout(route),
+        # o corpo segue sem ser descodificado, por isso o encoding tem de
+        # ser um que o cliente aceite
+        headers={
+            "Accept": request.headers.get("accept", "*/*"),
+            "Accept-Encoding": request.headers.get("accept-encoding", "identity"),
+            **conditional_headers(request),
+        }
+    )
+
+    async def body():
+        try:
+            async for chunk in r.aiter_raw():
+                yield chunk
+        finally:
+            await upstream.close_stream(r)
+
+    return StreamingResponse(
+        body(),
+        status_code=r.status_code,
+        headers={k: v for k, v in r.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS},
+        background=BackgroundTask(upstream.close_stream, r)
+    )
+
+# ---------------- CACHE ----------------
+
+CACHE = TTLCache(max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+
+# TTL (segundos) por rota; 0 desativa a cache nessa rota
+CACHE_TTLS = {
+    "/api/orders/list": float(os.getenv("CACHE_TTL_ORDERS", "2.0")),
+    "/api/payments/list": float(os.getenv("CACHE_TTL_PAYMENTS", "2.0")),
+    "/api/notifications/list": float(os.getenv("CACHE_TTL_NOTIFICATIONS", "2.0")),
+}
+
+SINGLE_FLIGHT = SingleFlight()
+
+def cached_response(request: Request, entry: CachedResponse, cache_status: str):
+    headers = {"X-Cache": cache_status}
+    if entry.etag:
+        headers["ETag"] = entry.etag
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+# GET idempotente: cache (se a rota tiver TTL) e depois single-flight, para
+# que pedidos iguais em simultâneo façam um único request upstream.
+# Entradas expiradas com ETag são revalidadas com If-None-Match; sem entrada
+# na cache segue o If-None-Match do cliente, e um 304 do serviço volta como 304.
+async def cached_get(route: str, request: Request, upstream: Service, path: str, params=None):
+    if route in STREAM_ROUTES:
+        return await stream_get(route, request, upstream, path, params)
+
+    key = request.url.query
+    ttl = CACHE_TTLS.get(route, 0)
+
+    stale = None
+    if ttl > 0:
+        cached = CACHE.get(route, key)
+        if cached is not None:
+            return cached_response(request, cached, "HIT")
+        stale = CACHE.stale(route, key)
+
+    if stale is not None:
+        validator, flight_key = stale.etag, key
+    else:
+        # o resultado depende do validador do cliente, por isso não pode ser
+        # partilhado com pedidos que tragam outro
+        validator = request.headers.get("if-none-match")
+        flight_key = f"{key}|{validator}" if validator else key
+
+    async def fetch():
+        r = await upstream.get(
+            path,
+            params=request.query_params if params is None else params,
+            headers={"If-None-Match": validator} if validator else None,
+            timeout=ROUTING.timeout(route)
+        )
+
+        if r.status_code == 304:
+            etag = r.headers.get("etag", validator)
+            if stale is None:
+                return CachedResponse(b"", None, etag)
+            CACHE_REVALIDATIONS.labels(route=route, result="not_modified").inc()
+            CACHE.set(route, key, stale, ttl)
+            return stale
+
+        r.raise_for_status()
+        if stale is not None:
+            CACHE_REVALIDATIONS.labels(route=route, result="modified").inc()
+
+        entry = CachedResponse(
+            r.content,
+            r.headers.get("content-type", "application/json"),
+            r.headers.get("etag")
+        )
+        CACHE.set(route, key, entry, ttl)
+        return entry
+
+    entry = await SINGLE_FLIGHT.do(route, flight_key, fetch)
+    return cached_response(request, entry, "REVALIDATED" if entry is stale else "MISS")
+
 # ---------------- MIDDLEWARE ----------------
 
+ADMISSION = AdmissionController()
+
+# proxies (IPs ou redes, separados por vírgulas) cujo X-Forwarded-For é
+# aceite; vindo de qualquer outro peer o header é ignorado, senão um cliente
+# podia mudá-lo a cada pedido para fugir ao seu token bucket
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(p.strip(), strict=False)
+    for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()
+]
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+def client_id(request: Request) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if not is_trusted_proxy(peer):
+        return peer
+
+    # da direita para a esquerda: o primeiro endereço que não é um proxy
+    # conhecido é o cliente; os anteriores foram escritos por ele
+    forwarded = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+    for host in reversed(forwarded):
+        if not is_trusted_proxy(host):
+            return host
+    return forwarded[0] if forwarded else peer
+
 @app.middleware("http")
 async def prometheus_middleware(request: Request, call_next):
     start_time = time.perf_counter()
-    response = await call_next(request)
-    duration = time.perf_counter() - start_time
 
-    REQUESTS_TOTAL.labels(
-        method=request.method,
-        path=request.url.path,
-        status=response.status_code
-    ).inc()
+    rejection = ADMISSION.admit(client_id(request), request.url.path)
+    if rejection is not None:
+        response = FastJSONResponse(
+            status_code=rejection.status,
+            content={
+                "error": rejection.reason,
+                "retry_after": round(rejection.retry_after, 3),
+            },
+            headers={"Retry-After": str(max(1, math.ceil(rejection.retry_after)))}
+        )
+    else:
+        try:
+            response = await call_next(request)
+        finally:
+            ADMISSION.release()
 
-    REQUEST_LATENCY.labels(
-        method=request.method,
-        path=request.url.path
-    ).observe(duration)
+    duration = time.perf_counter() - start_time
+
+    observe_request(
+        request.method if request.method in KNOWN_METHODS else "OTHER",
+        path_label(request),
+        response.status_code,
+        duration
+    )
 
     return response
 
-# ---------------- HEALTH ----------------
+# adicionado por último para ser o middleware exterior: o span do pedido
+# inclui a admissão e a compressão
+app.add_middleware(TracingMiddleware)
 
-async def check_service(url: str):
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            start = time.perf_counter()
-            r = await client.get(f"{url}/health")
-            latency = int((time.perf_counter() - start) * 1000)
-            return {
-                "service": url,
-                "status": "online" if r.status_code == 200 else "degraded",
-                "latency_ms": latency,
-            }
-    except Exception as e:
-        return {
-            "service": url,
-            "status": "offline",
-            "error": str(e)
-        }
+# ---------------- HEALTH ----------------
 
+# O estado é mantido pelo HealthProber em background; aqui só se lê.
 @app.get("/api/health")
 async def health():
-    return {
-        "services": await asyncio.gather(
-            *[check_service(s) for s in SERVICES]
-        )
-    }
+    return FastJSONResponse({"services": HEALTH.snapshot()})
 
 # ---------------- ORDERS ----------------
 
 @app.get("/api/orders/list")
-async def list_orders():
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{ORDERS_URL}/orders")
-        r.raise_for_status()
-        return r.json()
+async def list_orders(request: Request):
+    return await cached_get("/api/orders/list", request, ORDERS, "/orders")
+
+# NDJSON/CSV em streaming, sem passar pela cache nem ser bufferizado no gateway
+@app.get("/api/orders/export")
+async def export_orders(request: Request):
+    return await stream_get("/api/orders/export", request, ORDERS, "/orders/export")
+
+@app.get("/api/stream/orders")
+async def stream_orders(request: Request):
+    return ORDERS_FEED.response(request)
+
+# headers das respostas do orders que seguem para o cliente
+IDEMPOTENCY_RESPONSE_HEADERS = ("idempotent-replayed", "retry-after")
 
 @app.post("/api/orders/create")
-async def create_order(payload: dict):
-    async with httpx.AsyncClient() as client:
-        r = await client.post(f"{ORDERS_URL}/orders", json=payload)
+async def create_order(payload: dict, request: Request):
+    timeout = ROUTING.timeout("/api/orders/create")
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        r = await ORDERS.request("POST", "/orders", json=payload, timeout=timeout)
+    else:
+        # com a chave o orders deduplica, e um timeout pode ser repetido
+        r = await ORDERS.post_idempotent("/orders", json=payload, timeout=timeout, headers={"Idempotency-Key": key})
+
+    headers = {h: r.headers[h] for h in IDEMPOTENCY_RESPONSE_HEADERS if h in r.headers}
+    media_type = r.headers.get("content-type", "application/json")
+
+    # 400/409/422 do orders (chave inválida, em curso ou reutilizada) seguem tal como vieram
+    if r.status_code >= 500:
         r.raise_for_status()
-        return r.json()
+    if r.status_code >= 400:
+        return Response(r.content, status_code=r.status_code, media_type=media_type, headers=headers)
+
+    # uma nova order cria também um payment e uma notification
+    if "idempotent-replayed" not in r.headers:
+        CACHE.invalidate(
+            "/api/orders/list",
+            "/api/payments/list",
+            "/api/notifications/list",
+        )
+    return Response(r.content, media_type=media_type, headers=headers)
+
+@app.post("/api/orders/batch")
+async def create_orders_batch(request: Request):
+    # o corpo segue sem ser interpretado; a validação por item é do orders
+    r = await ORDERS.request(
+        "POST",
+        "/orders/bulk",
+        content=await request.body(),
+        headers={"Content-Type": "application/json"},
+        timeout=ROUTING.timeout("/api/orders/batch")
+    )
+    if r.status_code >= 500:
+        r.raise_for_status()
+
+    if r.status_code in (201, 207):
+        CACHE.invalidate(
+            "/api/orders/list",
+            "/api/payments/list",
+            "/api/notifications/list",
+        )
+
+    # 201/207/400 com os resultados por item seguem tal como vieram
+    return Response(
+        r.content,
+        status_code=r.status_code,
+        media_type=r.headers.get("content-type", "application/json")
+    )
+
+async def fetch_json(upstream: Service, path: str, params=None):
+    r = await upstream.get(path, params=params)
+    r.raise_for_status()
+    return r.json()
+
+def section_error(exc: BaseException):
+    if isinstance(exc, CircuitOpenError):
+        return {"status": "unavailable", "error": "circuit_open"}
+    if isinstance(exc, httpx.HTTPStatusError):
+        return {"status": "error", "error": f"upstream returned {exc.response.status_code}"}
+    return {"status": "error", "error": str(exc) or type(exc).__name__}
+
+# Order + payments + notifications num só pedido. Os três pedidos correm em
+# paralelo sob um único deadline; secções que falhem ou não respondam a
+# tempo vêm marcadas e o resto da resposta segue na mesma.
+@app.get("/api/orders/{order_id}/full")
+async def get_order_full(order_id: int):
+    list_params = {"order_id": order_id, "limit": 1000}
+    tasks = {
+        "order": asyncio.ensure_future(fetch_json(ORDERS, f"/orders/{order_id}")),
+        "payments": asyncio.ensure_future(fetch_json(PAYMENTS, "/payments", list_params)),
+        "notifications": asyncio.ensure_future(fetch_json(NOTIFICATIONS, "/notifications", list_params)),
+    }
+
+    _, pending = await asyncio.wait(tasks.values(), timeout=COMPOSITE_DEADLINE)
+    for task in pending:
+        task.cancel()
+
+    result = {"order_id": order_id}
+    for name, task in tasks.items():
+        if task in pending:
+            result[name] = {"status": "timeout"}
+        elif task.exception() is not None:
+            result[name] = section_error(task.exception())
+        else:
+            data = task.result()
+            result[name] = {"status": "ok", "data": data if name == "order" else data["data"]}
+
+    order_error = None if tasks["order"] in pending else tasks["order"].exception()
+    if isinstance(order_error, httpx.HTTPStatusError) and order_error.response.status_code == 404:
+        return FastJSONResponse(status_code=404, content={"error": f"order {order_id} not found"})
+
+    result["partial"] = any(result[name]["status"] != "ok" for name in tasks)
+    return FastJSONResponse(result)
 
 # Alias para simplificar testes e demonstração
 @app.post("/api/orders")
-async def create_order_alias(payload: dict):
-    return await create_order(payload)
+async def create_order_alias(payload: dict, request: Request):
+    return await create_order(payload, request)
 
 # ---------------- PAYMENTS ----------------
 
 @app.get("/api/payments/list")
-async def list_payments():
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{PAYMENTS_URL}/payments")
-        r.raise_for_status()
-        return r.json()
+async def list_payments(request: Request):
+    return await cached_get("/api/payments/list", request, PAYMENTS, "/payments")
+
+@app.get("/api/payments/export")
+async def export_payments(request: Request):
+    return await stream_get("/api/payments/export", request, PAYMENTS, "/payments/export")
 
 # ---------------- NOTIFICATIONS ----------------
 
 @app.get("/api/notifications/list")
-async def list_notifications():
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{NOTIFICATIONS_URL}/notifications")
-        r.raise_for_status()
-        return r.json()
+async def list_notifications(request: Request):
+    return await cached_get("/api/notifications/list", request, NOTIFICATIONS, "/notifications")
+
+@app.get("/api/stream/notifications")
+async def stream_notifications(request: Request):
+    return NOTIFICATIONS_FEED.response(request)
 
 # ---------------- LOGS ----------------
 
 @app.get("/api/logs")
-async def get_logs(service: str = "all"):
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{LOGS_URL}/logs",
-            params={"service": service}
-        )
-        r.raise_for_status()
-        return r.json()
+async def get_logs(request: Request, service: str = "all"):
+    return await cached_get(
+        "/api/logs",
+        request,
+        LOGS,
+        "/logs",
+        params={"service": service}
+    )
 
 # ---------------- METRICAS ----------------
 
 @app.get("/api/metrics/summary")
-async def metrics_summary():
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"{METRICAS_URL}/summary")
-        r.raise_for_status()
-        return r.json()
+async def metrics_summary(request: Request):
+    return await cached_get("/api/metrics/summary", request, METRICAS, "/summary")
 
 # ---------------- PROMETHEUS ENDPOINT ----------------
 
+# Com vários workers agrega as métricas de todos os processos.
 @app.get("/metrics")
 def metrics():
     return Response(
-        generate_latest(),
+        generate_latest(metrics_registry()),
         media_type=CONTENT_TYPE_LATEST
     )
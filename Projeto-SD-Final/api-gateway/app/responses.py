@@ -0,0 +1,148 @@
+import gzip
+import os
+import time
+
+import orjson
+from fastapi.responses import JSONResponse
+from prometheus_client import Histogram
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---------------- CONFIG ----------------
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+RESPONSE_ENCODE_LATENCY = Histogram(
+    "api_gateway_response_encode_seconds",
+    "Tempo de serialização JSON das respostas do API Gateway"
+)
+
+RESPONSE_COMPRESS_LATENCY = Histogram(
+    "api_gateway_response_compress_seconds",
+    "Tempo de compressão das respostas do API Gateway",
+    ["encoding"]
+)
+
+# ---------------- JSON ----------------
+
+# orjson serializa datetimes, dataclasses, etc. sem passar pelo encoder
+# genérico. Os handlers devolvem FastJSONResponse(...) diretamente para
+# evitar também o jsonable_encoder do FastAPI.
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = orjson.dumps(content)
+        RESPONSE_ENCODE_LATENCY.observe(time.perf_counter() - start)
+        return body
+
+# ---------------- ETAGS ----------------
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+# ---------------- COMPRESSION ----------------
+
+def accepted_encodings(header: str) -> dict:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    return accepted
+
+def choose_encoding(header: str):
+    accepted = accepted_encodings(header or "")
+    wildcard = accepted.get("*", 0)
+
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    start = time.perf_counter()
+    if encoding == "br":
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    RESPONSE_COMPRESS_LATENCY.labels(encoding=encoding).observe(time.perf_counter() - start)
+    return body
+
+
+# Middleware ASGI que comprime respostas de corpo único a partir de
+# COMPRESS_MIN_SIZE bytes. Respostas em streaming e corpos que já vêm
+# comprimidos do serviço passam tal como estão.
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+
+            if (
+                message.get("more_body", False)
+                or "content-encoding" in headers
+                or start["status"] in (204, 304)
+                or len(body) < COMPRESS_MIN_SIZE
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
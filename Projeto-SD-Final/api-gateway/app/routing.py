@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from app.hedging import HEDGE_WINS, HEDGED_REQUESTS, RETRIES, LatencyWindow, RetryBudget
+from app.upstream import Upstream
+
+# ---------------- CONFIG ----------------
+
+# Ficheiro JSON com a tabela de routing, por exemplo:
+#   {
+#     "balancer": "p2c",
+#     "services": {
+#       "orders": {"replicas": ["http://orders-1:5001", "http://orders-2:5001"], "timeout": 5},
+#       ...
+#     },
+#     "routes": {"/api/orders/batch": {"timeout": 30}}
+#   }
+# As rotas do ficheiro juntam-se às de default_routing_table(), e sobrepõem-se a elas.
+# Sem ficheiro, cada serviço usa <SERVIÇO>_URL, que aceita várias réplicas
+# separadas por vírgula.
+GATEWAY_ROUTES_FILE = os.getenv("GATEWAY_ROUTES_FILE")
+GATEWAY_BALANCER = os.getenv("GATEWAY_BALANCER", "p2c")
+
+DEFAULT_SERVICE_URLS = {
+    "orders": "http://orders:5001",
+    "payments": "http://payments:5002",
+    "logs": "http://logs:5003",
+    "notifications": "http://notifications:5004",
+    "metricas": "http://metricas:5005",
+}
+
+BALANCERS = ("p2c", "least_outstanding")
+
+def default_routing_table() -> dict:
+    return {
+        "balancer": GATEWAY_BALANCER,
+        "services": {
+            name: {"replicas": [u.strip() for u in os.getenv(f"{name.upper()}_URL", url).split(",") if u.strip()]}
+            for name, url in DEFAULT_SERVICE_URLS.items()
+        },
+        "routes": {
+            "/api/orders/batch": {"timeout": float(os.getenv("BULK_TIMEOUT", "30.0"))},
+            # o read timeout conta entre chunks: um export filtrado pode demorar
+            # a encontrar as primeiras linhas
+            "/api/orders/export": {"timeout": float(os.getenv("EXPORT_TIMEOUT", "60.0"))},
+            "/api/payments/export": {"timeout": float(os.getenv("EXPORT_TIMEOUT", "60.0"))},
+        },
+    }
+
+def load_routing_table() -> dict:
+    if not GATEWAY_ROUTES_FILE:
+        return default_routing_table()
+    with open(GATEWAY_ROUTES_FILE) as f:
+        config = json.load(f)
+    # as rotas por omissão (timeouts do batch e dos exports) continuam a valer
+    # para as rotas que o ficheiro não define
+    config["routes"] = {**default_routing_table()["routes"], **config.get("routes", {})}
+    return config
+
+# ---------------- SERVICE ----------------
+
+# Conjunto de réplicas de um serviço. Cada pedido vai para a réplica
+# escolhida pelo balanceamento, entre as que estão online e com o circuito
+# fechado; só se nenhuma estiver se tenta uma qualquer (e o breaker decide).
+class Service:
+    def __init__(self, name: str, replicas: list, timeout: float = None, balancer: str = "p2c"):
+        if not replicas:
+            raise ValueError(f"service {name} has no replicas")
+        if balancer not in BALANCERS:
+            raise ValueError(f"unknown balancer {balancer!r} (expected one of {', '.join(BALANCERS)})")
+
+        self.name = name
+        self.balancer = balancer
+        self.replicas = [
+            Upstream(name if len(replicas) == 1 else f"{name}-{i}", url, service=name, timeout=timeout)
+            for i, url in enumerate(replicas, 1)
+        ]
+        self.latency = LatencyWindow()
+        self.retry_budget = RetryBudget(name)
+        self._streams = {}
+
+    async def start(self):
+        for replica in self.replicas:
+            await replica.start()
+
+    async def close(self):
+        for replica in self.replicas:
+            await replica.close()
+
+    @property
+    def in_flight(self) -> int:
+        return sum(r.in_flight for r in self.replicas)
+
+    def pick(self, exclude: Upstream = None) -> Upstream:
+        candidates = [
+            r for r in self.replicas
+            if r is not exclude and r.healthy and r.breaker.available
+        ]
+        if not candidates:
+            candidates = [r for r in self.replicas if r is not exclude] or self.replicas
+
+        if len(candidates) == 1:
+            return candidates[0]
+
+        if self.balancer == "least_outstanding":
+            fewest = min(r.in_flight for r in candidates)
+            return random.choice([r for r in candidates if r.in_flight == fewest])
+
+        # power of two choices: duas réplicas ao acaso, fica a menos ocupada
+        a, b = random.sample(candidates, 2)
+        return a if a.in_flight <= b.in_flight else b
+
+    def _replica_for(self, url: httpx.URL):
+        for replica in self.replicas:
+            if (url.host, url.port) == (replica.origin.host, replica.origin.port):
+                return replica
+        return None
+
+    async def _send(self, replica: Upstream, method: str, path: str, stream: bool, kwargs: dict) -> httpx.Response:
+        start = time.perf_counter()
+        r = await replica.request(method, path, stream=stream, **kwargs)
+        if stream:
+            self._streams[r] = replica
+        if r.status_code < 500:
+            self.latency.observe(time.perf_counter() - start)
+        return r
+
+    async def request(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        return await self._send(self.pick(), method, path, stream, kwargs)
+
+    async def close_stream(self, r: httpx.Response):
+        replica = self._streams.pop(r, None)
+        if replica is not None:
+            await replica.close_stream(r)
+
+    # GET idempotente: hedge quando o primeiro pedido passa do p95 observado
+    # e um retry após erro de rede/5xx, ambos limitados pelo retry budget.
+    # O hedge e o retry vão, sempre que possível, para outra réplica.
+    async def get(self, path: str, **kwargs) -> httpx.Response:
+        self.retry_budget.deposit()
+
+        try:
+            r = await self._hedged_get(path, kwargs)
+        except httpx.TransportError as exc:
+            if not self.retry_budget.withdraw():
+                raise
+            RETRIES.labels(upstream=self.name).inc()
+            return await self._hedged_get(path, kwargs, exclude=self._replica_for(exc.request.url))
+
+        if r.status_code >= 500 and self.retry_budget.withdraw():
+            RETRIES.labels(upstream=self.name).inc()
+            return await self._hedged_get(path, kwargs, exclude=self._replica_for(r.request.url))
+        return r
+
+    # POST com Idempotency-Key: repeti-lo não duplica nada no serviço, por
+    # isso tem o mesmo retry (e budget) que o get()
+    async def post_idempotent(self, path: str, **kwargs) -> httpx.Response:
+        self.retry_budget.deposit()
+
+        try:
+            return await self.request("POST", path, **kwargs)
+        except httpx.TransportError as exc:
+            if not self.retry_budget.withdraw():
+                raise
+            RETRIES.labels(upstream=self.name).inc()
+            return await self._send(self.pick(self._replica_for(exc.request.url)), "POST", path, False, kwargs)
+
+    async def _hedged_get(self, path: str, kwargs: dict, exclude: Upstream = None) -> httpx.Response:
+        first = self.pick(exclude)
+        delay = self.latency.hedge_delay()
+        if delay is None:
+            return await self._send(first, "GET", path, False, kwargs)
+
+        tasks = {asyncio.ensure_future(self._send(first, "GET", path, False, kwargs))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self.retry_budget.withdraw():
+                return await next(iter(tasks))
+
+            HEDGED_REQUESTS.labels(upstream=self.name).inc()
+            hedge = asyncio.ensure_future(self._send(self.pick(first), "GET", path, False, kwargs))
+            tasks.add(hedge)
+
+            # fica com a primeira resposta; se uma falhar espera pela outra
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGE_WINS.labels(upstream=self.name).inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+# ---------------- ROUTING TABLE ----------------
+
+class RoutingTable:
+    def __init__(self, config: dict):
+        balancer = config.get("balancer", GATEWAY_BALANCER)
+        self.services = {
+            name: Service(
+                name,
+                spec["replicas"],
+                timeout=spec.get("timeout"),
+                balancer=spec.get("balancer", balancer),
+            )
+            for name, spec in config["services"].items()
+        }
+        self.route_timeouts = {
+            route: float(spec["timeout"])
+            for route, spec in config.get("routes", {}).items()
+            if "timeout" in spec
+        }
+
+    def service(self, name: str) -> Service:
+        try:
+            return self.services[name]
+        except KeyError:
+            raise KeyError(f"service {name} is missing from the routing table") from None
+
+    def replicas(self) -> list:
+        return [r for s in self.services.values() for r in s.replicas]
+
+    # timeout de uma rota do gateway; sem entrada usa o timeout do serviço
+    def timeout(self, route: str):
+        return self.route_timeouts.get(route, httpx.USE_CLIENT_DEFAULT)
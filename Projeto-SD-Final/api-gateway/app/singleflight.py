@@ -0,0 +1,31 @@
+import asyncio
+
+from prometheus_client import Counter
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+COALESCED_REQUESTS = Counter(
+    "api_gateway_coalesced_requests_total",
+    "Pedidos que partilharam um request upstream já em curso",
+    ["route"]
+)
+
+# ---------------- SINGLE-FLIGHT ----------------
+
+# Pedidos concorrentes com a mesma chave esperam pela mesma task upstream
+# e partilham o resultado (ou a exceção).
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, route: str, key, fn):
+        task = self._calls.get((route, key))
+        if task is not None:
+            COALESCED_REQUESTS.labels(route=route).inc()
+        else:
+            task = asyncio.ensure_future(fn())
+            self._calls[(route, key)] = task
+            task.add_done_callback(lambda _: self._calls.pop((route, key), None))
+
+        # shield: se um cliente desistir, a task continua para os restantes
+        return await asyncio.shield(task)
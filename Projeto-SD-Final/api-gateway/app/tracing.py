@@ -0,0 +1,250 @@
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+import orjson
+from prometheus_client import Counter
+from starlette.datastructures import Headers
+
+# ---------------- CONFIG ----------------
+
+# Sem TRACE_EXPORT_FILE nem TRACE_COLLECTOR_URL os spans não são exportados,
+# mas o traceparent continua a ser propagado.
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "1.0"))
+
+logger = logging.getLogger("api-gateway")
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+TRACE_SPANS_EXPORTED = Counter(
+    "api_gateway_trace_spans_exported_total",
+    "Spans exportados pelo API Gateway"
+)
+
+TRACE_SPANS_DROPPED = Counter(
+    "api_gateway_trace_spans_dropped_total",
+    "Spans descartados pelo API Gateway (fila cheia ou erro de exportação)"
+)
+
+CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+# ---------------- TRACEPARENT ----------------
+
+# W3C trace context: 00-<trace_id 32 hex>-<parent_id 16 hex>-<flags>
+def parse_traceparent(header: str):
+    if not header:
+        return None
+
+    parts = header.strip().split("-")
+    if len(parts) < 4 or parts[0] == "ff" or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        if int(parts[1], 16) == 0 or int(parts[2], 16) == 0:
+            return None
+    except ValueError:
+        return None
+    return parts[1].lower(), parts[2].lower(), bool(flags & 1)
+
+# ---------------- SPANS ----------------
+
+class Span:
+    __slots__ = (
+        "tracer", "name", "kind", "trace_id", "span_id", "parent_id",
+        "sampled", "start_ns", "attributes", "error", "_token"
+    )
+
+    def __init__(self, tracer, name, kind, trace_id, parent_id, sampled, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def activate(self):
+        self._token = CURRENT_SPAN.set(self)
+
+    def end(self):
+        if self._token is not None:
+            CURRENT_SPAN.reset(self._token)
+            self._token = None
+        if self.sampled and self.tracer.enabled:
+            self.tracer.export(self, time.time_ns())
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+# ---------------- TRACER ----------------
+
+# Os spans terminados vão para uma fila limitada e uma thread exporta-os em
+# lotes (JSON Zipkin v2, uma linha por span no ficheiro ou POST ao
+# collector), para o pedido só pagar a criação do span e um put_nowait.
+# Com vários workers cada um tem a sua thread; o ficheiro é aberto em append
+# e cada lote é escrito com um único write.
+class Tracer:
+    def __init__(self, service: str):
+        self.service = service
+        self.enabled = bool(TRACE_EXPORT_FILE or TRACE_COLLECTOR_URL)
+
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def start_span(self, name: str, kind: str = None, parent=None, attributes=None) -> Span:
+        if parent is None:
+            parent = CURRENT_SPAN.get()
+
+        if isinstance(parent, Span):
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id = None
+            sampled = random.random() < TRACE_SAMPLE_RATE
+
+        return Span(self, name, kind, trace_id, parent_id, sampled, attributes)
+
+    # ---------------- EXPORT ----------------
+
+    def export(self, span: Span, end_ns: int):
+        try:
+            self._queue.put_nowait((span, end_ns))
+        except queue.Full:
+            TRACE_SPANS_DROPPED.inc()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_EXPORT_INTERVAL
+            while len(batch) < TRACE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _zipkin(self, span: Span, end_ns: int) -> dict:
+        data = {
+            "traceId": span.trace_id,
+            "id": span.span_id,
+            "name": span.name,
+            "timestamp": span.start_ns // 1000,
+            "duration": max(1, (end_ns - span.start_ns) // 1000),
+            "localEndpoint": {"serviceName": self.service},
+            "tags": {k: str(v) for k, v in span.attributes.items()},
+        }
+        if span.parent_id:
+            data["parentId"] = span.parent_id
+        if span.kind:
+            data["kind"] = span.kind
+        if span.error:
+            data["tags"]["error"] = span.error
+        return data
+
+    def _write(self, batch):
+        spans = [self._zipkin(span, end_ns) for span, end_ns in batch]
+        try:
+            with self._lock:
+                if TRACE_EXPORT_FILE:
+                    with open(TRACE_EXPORT_FILE, "ab") as f:
+                        f.write(b"".join(orjson.dumps(s) + b"\n" for s in spans))
+                if TRACE_COLLECTOR_URL:
+                    req = urllib.request.Request(
+                        TRACE_COLLECTOR_URL,
+                        data=orjson.dumps(spans),
+                        headers={"Content-Type": "application/json"},
+                        method="POST",
+                    )
+                    urllib.request.urlopen(req, timeout=2).close()
+            TRACE_SPANS_EXPORTED.inc(len(spans))
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+            TRACE_SPANS_DROPPED.inc(len(spans))
+
+
+TRACER = Tracer("api-gateway")
+
+# ---------------- MIDDLEWARE ----------------
+
+# Span SERVER por pedido, filho do traceparent recebido. O nome usa o
+# template da rota (preenchido pelo router no scope), como as métricas.
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        span = TRACER.start_span(
+            scope["method"],
+            kind="SERVER",
+            parent=parse_traceparent(Headers(scope=scope).get("traceparent")),
+            attributes={"http.method": scope["method"], "http.path": scope["path"]},
+        )
+
+        async def send_traced(message):
+            if message["type"] == "http.response.start":
+                span.set("http.status_code", message["status"])
+            await send(message)
+
+        span.activate()
+        try:
+            await self.app(scope, receive, send_traced)
+        except BaseException as exc:
+            span.error = f"{type(exc).__name__}: {exc}"
+            raise
+        finally:
+            route = scope.get("route")
+            span.name = f"{scope['method']} {getattr(route, 'path', '__unmatched__')}"
+            span.end()
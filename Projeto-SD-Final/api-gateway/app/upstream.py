@@ -0,0 +1,185 @@
+import os
+import time
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from app.breaker import CircuitBreaker
+from app.tracing import TRACER
+
+# ---------------- CONFIG ----------------
+
+DEFAULT_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5.0"))
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "1.0"))
+MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30.0"))
+
+# ---------------- PROMETHEUS METRICS ----------------
+
+UPSTREAM_REQUESTS_TOTAL = Counter(
+    "api_gateway_upstream_requests_total",
+    "Total de requests enviadas pelo API Gateway aos serviços",
+    ["upstream"]
+)
+
+UPSTREAM_CONNECTIONS_OPENED = Counter(
+    "api_gateway_upstream_connections_opened_total",
+    "Ligações TCP abertas pelo API Gateway aos serviços",
+    ["upstream"]
+)
+
+UPSTREAM_CONNECTION_REUSE = Gauge(
+    "api_gateway_upstream_connection_reuse_ratio",
+    "Fração de requests que reutilizaram uma ligação keep-alive",
+    ["upstream"],
+    multiprocess_mode="liveall"
+)
+
+UPSTREAM_POOL_IN_USE = Gauge(
+    "api_gateway_upstream_pool_in_use",
+    "Ligações do pool em uso por serviço",
+    ["upstream"],
+    multiprocess_mode="livesum"
+)
+
+UPSTREAM_POOL_SATURATION = Gauge(
+    "api_gateway_upstream_pool_saturation",
+    "Ocupação do pool de ligações (em uso / max_connections)",
+    ["upstream"],
+    multiprocess_mode="livemax"
+)
+
+# ---------------- UPSTREAM ----------------
+
+# Um cliente HTTP persistente (keep-alive) por réplica, criado no arranque
+# da app e fechado no shutdown. As variáveis <SERVIÇO>_* aplicam-se a todas
+# as réplicas do serviço; o timeout da tabela de routing tem prioridade.
+class Upstream:
+    def __init__(self, name: str, url: str, service: str = None, timeout: float = None):
+        env = (service or name).upper()
+        if timeout is None:
+            timeout = float(os.getenv(f"{env}_TIMEOUT", DEFAULT_TIMEOUT))
+
+        self.name = name
+        self.service = service or name
+        self.url = url
+        self.origin = httpx.URL(url)
+        self.timeout = httpx.Timeout(timeout, connect=min(timeout, CONNECT_TIMEOUT))
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv(f"{env}_MAX_CONNECTIONS", MAX_CONNECTIONS)),
+            max_keepalive_connections=int(os.getenv(f"{env}_MAX_KEEPALIVE", MAX_KEEPALIVE)),
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        )
+        self.client = None
+        self.breaker = CircuitBreaker(name)
+        # atualizado pelo HealthProber
+        self.healthy = True
+
+        self.in_flight = 0
+        # respostas em streaming ainda por libertar; o is_closed não serve,
+        # porque o aiter_raw() fecha a resposta quando lê o corpo todo
+        self._open_streams = set()
+        self.requests = 0
+        self.connections_opened = 0
+
+    async def start(self):
+        if self.client is None:
+            self.client = httpx.AsyncClient(
+                base_url=self.url,
+                timeout=self.timeout,
+                limits=self.limits,
+            )
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def _trace(self, event_name: str, info: dict):
+        # o httpcore só emite connect_tcp quando abre uma ligação nova
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+            UPSTREAM_CONNECTIONS_OPENED.labels(upstream=self.name).inc()
+
+    def _acquire(self):
+        self.in_flight += 1
+        self.requests += 1
+        UPSTREAM_REQUESTS_TOTAL.labels(upstream=self.name).inc()
+        self._update_pool_metrics()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._update_pool_metrics()
+        UPSTREAM_CONNECTION_REUSE.labels(upstream=self.name).set(
+            1 - min(self.connections_opened, self.requests) / self.requests
+        )
+
+    def _update_pool_metrics(self):
+        UPSTREAM_POOL_IN_USE.labels(upstream=self.name).set(self.in_flight)
+        UPSTREAM_POOL_SATURATION.labels(upstream=self.name).set(
+            self.in_flight / self.limits.max_connections
+        )
+
+    # Com stream=True o corpo não é lido: o chamador tem de o consumir e
+    # depois chamar close_stream() para devolver a ligação ao pool.
+    async def request(self, method: str, path: str, stream: bool = False, **kwargs) -> httpx.Response:
+        if self.client is None:
+            await self.start()
+
+        # com o circuito aberto falha logo, sem tocar na rede
+        self.breaker.before_call()
+
+        self._acquire()
+        span = TRACER.start_span(
+            f"{method} {self.service}",
+            kind="CLIENT",
+            attributes={"peer.service": self.name, "http.method": method, "http.path": path},
+        )
+        start = time.perf_counter()
+        try:
+            request = self.client.build_request(
+                method,
+                path,
+                extensions={"trace": self._trace},
+                **kwargs
+            )
+            request.headers["traceparent"] = span.traceparent()
+            r = await self.client.send(request, stream=stream)
+        except httpx.TransportError as exc:
+            self.breaker.on_failure()
+            self._release()
+            span.error = f"{type(exc).__name__}: {exc}"
+            span.end()
+            raise
+        except BaseException as exc:
+            self.breaker.on_cancel()
+            self._release()
+            span.error = type(exc).__name__
+            span.end()
+            raise
+
+        if stream:
+            self._open_streams.add(r)
+        else:
+            self._release()
+
+        # em streaming o span cobre só até aos headers
+        span.set("http.status_code", r.status_code)
+        span.end()
+
+        if r.status_code >= 500:
+            self.breaker.on_failure()
+        else:
+            self.breaker.on_success(time.perf_counter() - start)
+        return r
+
+    # chamado no fim do corpo e pela BackgroundTask: liberta uma só vez
+    async def close_stream(self, r: httpx.Response):
+        if r not in self._open_streams:
+            return
+        self._open_streams.discard(r)
+        try:
+            await r.aclose()
+        finally:
+            self._release()
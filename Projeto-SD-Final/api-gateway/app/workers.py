@@ -0,0 +1,78 @@
+import fcntl
+import json
+import os
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+# ---------------- CONFIG ----------------
+
+# Definidos pelo start.sh quando o gateway corre com vários workers uvicorn.
+GATEWAY_WORKERS = max(1, int(os.getenv("GATEWAY_WORKERS", "1")))
+GATEWAY_STATE_DIR = os.getenv("GATEWAY_STATE_DIR")
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# ---------------- PROMETHEUS ----------------
+
+# Com vários workers cada processo escreve as suas métricas em ficheiros
+# no PROMETHEUS_MULTIPROC_DIR e o /metrics agrega-os todos.
+def metrics_registry():
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def mark_worker_dead():
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+# ---------------- SHARED STATE ----------------
+
+# Ficheiro partilhado entre workers; None quando há um só processo.
+def state_path(name: str):
+    if not GATEWAY_STATE_DIR:
+        return None
+    return os.path.join(GATEWAY_STATE_DIR, name)
+
+def write_json(path: str, data):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def read_json(path: str):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+# Lock exclusivo (flock) que elege um worker para tarefas que só devem
+# correr uma vez por gateway. Se o líder morrer o kernel liberta o lock
+# e outro worker fica com ele na tentativa seguinte.
+class LeaderLock:
+    def __init__(self, name: str):
+        self.path = state_path(name)
+        self._fd = None
+
+    def acquire(self) -> bool:
+        if self.path is None or self._fd is not None:
+            return True
+
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
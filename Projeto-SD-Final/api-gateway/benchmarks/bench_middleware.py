@@ -0,0 +1,97 @@
+# Custo por request do registo de métricas no prometheus_middleware e
+# tempo de scrape do /metrics, antes e depois das labels por template.
+#
+#   old - labels com request.url.path e .labels() em cada request
+#   new - path_label() (template da rota, com limite) + observe_request()
+#
+# Uso: python benchmarks/bench_middleware.py [requests] [fração de paths únicos]
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest  # noqa: E402
+from prometheus_client import REGISTRY  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app import main  # noqa: E402
+
+N_REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+UNIQUE_FRACTION = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+
+ROUTES = {route.path: route for route in main.app.routes if hasattr(route, "path")}
+KNOWN = ["/api/orders/list", "/api/payments/list", "/api/notifications/list", "/api/health"]
+
+
+def make_requests():
+    random.seed(42)
+    requests = []
+    for i in range(N_REQUESTS):
+        if random.random() < UNIQUE_FRACTION:
+            if i % 2:
+                path, route = f"/api/orders/{i}/full", ROUTES["/api/orders/{order_id}/full"]
+            else:
+                path, route = f"/wp-admin/{i}.php", None
+        else:
+            path = random.choice(KNOWN)
+            route = ROUTES[path]
+
+        scope = {"type": "http", "method": "GET", "path": path, "headers": [], "query_string": b""}
+        if route is not None:
+            scope["route"] = route
+            scope["endpoint"] = route.endpoint
+        requests.append(Request(scope))
+    return requests
+
+
+def bench_old(requests):
+    registry = CollectorRegistry()
+    total = Counter("old_requests_total", "", ["method", "path", "status"], registry=registry)
+    latency = Histogram("old_request_duration_seconds", "", ["method", "path"], registry=registry)
+
+    start = time.perf_counter()
+    for request in requests:
+        total.labels(method=request.method, path=request.url.path, status=200).inc()
+        latency.labels(method=request.method, path=request.url.path).observe(0.001)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, registry
+
+
+def bench_new(requests):
+    start = time.perf_counter()
+    for request in requests:
+        method = request.method if request.method in main.KNOWN_METHODS else "OTHER"
+        main.observe_request(method, main.path_label(request), 200, 0.001)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, REGISTRY
+
+
+def report(name, elapsed, registry, metric):
+    series = sum(
+        1 for family in registry.collect() if family.name == metric
+        for sample in family.samples if sample.name.endswith("_total")
+    )
+    start = time.perf_counter()
+    body = generate_latest(registry)
+    scrape = time.perf_counter() - start
+
+    print(
+        f"{name:4} {elapsed / N_REQUESTS * 1e6:6.2f} µs/req  "
+        f"{series:7} séries  scrape {scrape * 1000:8.1f} ms  {len(body) / 1e6:6.2f} MB"
+    )
+
+
+if __name__ == "__main__":
+    requests = make_requests()
+    print(f"{N_REQUESTS} requests, {UNIQUE_FRACTION:.0%} com paths únicos")
+
+    elapsed, registry = bench_old(requests)
+    report("old", elapsed, registry, "old_requests")
+
+    elapsed, registry = bench_new(requests)
+    report("new", elapsed, registry, "api_gateway_requests")
@@ -0,0 +1,133 @@
+# Benchmark do /api/orders/list com respostas grandes.
+#
+# Compara três modos contra um serviço orders falso (local):
+#   json     - comportamento antigo: r.json() + re-serialização pelo FastAPI
+#   buffered - corpo do serviço reenviado tal como veio (sem json), em memória
+#   stream   - passthrough em chunks (STREAM_ROUTES)
+#
+# No fim verifica que as réplicas não ficam com pedidos em voo depois de
+# um stream lido até ao fim e de um cliente que desliga a meio.
+#
+# Uso: python benchmarks/bench_stream.py [n_orders] [iterações]
+
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+N_ORDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+ITERATIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+PAYLOAD = json.dumps({
+    "service": "orders",
+    "count": N_ORDERS,
+    "data": [
+        {
+            "id": i,
+            "product": f"Product {i}",
+            "price": 9.99 + i,
+            "timestamp": datetime.now().isoformat()
+        } for i in range(N_ORDERS)
+    ]
+}).encode()
+
+
+class OrdersHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), OrdersHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+os.environ["ORDERS_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+os.environ["CACHE_TTL_ORDERS"] = "0"
+
+import httpx  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+
+from app import main  # noqa: E402
+
+
+@main.app.get("/bench/orders/json")
+async def list_orders_json():
+    r = await main.ORDERS.request("GET", "/orders")
+    r.raise_for_status()
+    return r.json()
+
+
+async def fetch(client: httpx.AsyncClient, path: str):
+    async with client.stream("GET", path) as r:
+        async for _ in r.aiter_raw():
+            pass
+
+
+async def run(client: httpx.AsyncClient, path: str):
+    await fetch(client, path)
+
+    # tempo e memória medidos em passagens separadas: o tracemalloc
+    # abranda muito o caminho json
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        await fetch(client, path)
+    elapsed = (time.perf_counter() - start) / ITERATIONS
+
+    tracemalloc.start()
+    await fetch(client, path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak
+
+
+async def bench():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        print(f"{N_ORDERS} orders, {len(PAYLOAD) / 1e6:.1f} MB, {ITERATIONS} iterações")
+
+        for mode, path in (
+            ("json", "/bench/orders/json"),
+            ("buffered", "/api/orders/list"),
+        ):
+            elapsed, peak = await run(client, path)
+            print(f"{mode:10} {elapsed * 1000:8.1f} ms/req  pico {peak / 1e6:7.1f} MB")
+
+        main.STREAM_ROUTES.add("/api/orders/list")
+        elapsed, peak = await run(client, "/api/orders/list")
+        print(f"{'stream':10} {elapsed * 1000:8.1f} ms/req  pico {peak / 1e6:7.1f} MB")
+        check_released("stream lido até ao fim")
+
+        # cliente que desliga depois do primeiro chunk: o Starlette fecha o
+        # body_iterator sem correr a BackgroundTask
+        request = Request({"type": "http", "method": "GET", "path": "/api/orders/list", "headers": [], "query_string": b""})
+        response = await main.stream_get("/api/orders/list", request, main.ORDERS, "/orders")
+        body = response.body_iterator
+        await body.__anext__()
+        await body.aclose()
+        check_released("cliente desligado a meio")
+
+
+def check_released(case: str):
+    in_flight = {r.name: r.in_flight for r in main.ORDERS.replicas}
+    print(f"in_flight depois de {case}: {in_flight}")
+    assert not any(in_flight.values()), f"pedidos por libertar depois de {case}"
+
+
+if __name__ == "__main__":
+    asyncio.run(bench())
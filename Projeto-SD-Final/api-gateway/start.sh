@@ -0,0 +1,19 @@
+#!/bin/sh
+set -e
+
+# Um worker uvicorn por core disponível, a não ser que GATEWAY_WORKERS
+# esteja definido.
+GATEWAY_WORKERS="${GATEWAY_WORKERS:-$(nproc)}"
+export GATEWAY_WORKERS
+
+if [ "$GATEWAY_WORKERS" -gt 1 ]; then
+    # métricas agregadas entre workers (prometheus_client multiprocess)
+    export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}"
+    # estado partilhado: invalidações da cache e health checks
+    export GATEWAY_STATE_DIR="${GATEWAY_STATE_DIR:-/tmp/gateway-state}"
+
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" "$GATEWAY_STATE_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR" "$GATEWAY_STATE_DIR"
+fi
+
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers "$GATEWAY_WORKERS"
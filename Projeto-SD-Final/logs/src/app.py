@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, request
 from prometheus_client import (
     Counter,
     Histogram,
@@ -9,6 +9,8 @@ from datetime import datetime
 import time
 import logging
 
+from responses import ResponseLayer
+
 # ---------------- APP ----------------
 
 app = Flask(__name__)
@@ -30,6 +32,10 @@ LOGS_REQUEST_LATENCY = Histogram(
     ["method", "endpoint"]
 )
 
+# ---------------- RESPONSES ----------------
+
+responses = ResponseLayer(app, "logs")
+
 # ---------------- MIDDLEWARE ----------------
 
 @app.before_request
@@ -39,16 +45,19 @@ def start_timer():
 @app.after_request
 def record_metrics(response):
     duration = time.perf_counter() - request.start_time
+    # a regra (p.ex. /orders/<int:order_id>) e não o path, para o número de séries
+    # não crescer com os ids
+    endpoint = request.url_rule.rule if request.url_rule else "__unmatched__"
 
     LOGS_REQUESTS_TOTAL.labels(
         method=request.method,
-        endpoint=request.path,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
 
     LOGS_REQUEST_LATENCY.labels(
         method=request.method,
-        endpoint=request.path
+        endpoint=endpoint
     ).observe(duration)
 
     return response
@@ -61,7 +70,7 @@ def logs():
 
     logger.info(f"Logs requested for service={service}")
 
-    return jsonify({
+    return responses.json({
         "service": service,
         "logs": [
             {
@@ -77,7 +86,7 @@ def logs():
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "healthy"})
+    return responses.json({"status": "healthy"})
 
 @app.route("/metrics")
 def metrics():
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, request, Response
 from prometheus_client import (
     Counter,
     Histogram,
@@ -8,6 +8,8 @@ from prometheus_client import (
 import time
 import logging
 
+from responses import ResponseLayer
+
 # ---------------- APP ----------------
 
 app = Flask(__name__)
@@ -29,6 +31,10 @@ METRICAS_REQUEST_LATENCY = Histogram(
     ["method", "endpoint"]
 )
 
+# ---------------- RESPONSES ----------------
+
+responses = ResponseLayer(app, "metricas")
+
 # ---------------- MIDDLEWARE ----------------
 
 @app.before_request
@@ -38,16 +44,19 @@ def start_timer():
 @app.after_request
 def record_metrics(response):
     duration = time.perf_counter() - request.start_time
+    # a regra (p.ex. /orders/<int:order_id>) e não o path, para o número de séries
+    # não crescer com os ids
+    endpoint = request.url_rule.rule if request.url_rule else "__unmatched__"
 
     METRICAS_REQUESTS_TOTAL.labels(
         method=request.method,
-        endpoint=request.path,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
 
     METRICAS_REQUEST_LATENCY.labels(
         method=request.method,
-        endpoint=request.path
+        endpoint=endpoint
     ).observe(duration)
 
     return response
@@ -58,14 +67,14 @@ def record_metrics(response):
 def summary():
     logger.info("Metricas summary requested")
 
-    return jsonify({
+    return responses.json({
         "status": "ok",
         "message": "Metricas service is running"
     })
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "healthy"})
+    return responses.json({"status": "healthy"})
 
 @app.route("/metrics")
 def metrics():
@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, request
 from prometheus_client import (
     Counter,
     Histogram,
@@ -6,9 +6,15 @@ from prometheus_client import (
     CONTENT_TYPE_LATEST
 )
 from datetime import datetime
+import base64
+import bisect
+import threading
 import time
 import logging
 
+from responses import ResponseLayer, make_etag
+from tracing import Tracer
+
 # ---------------- DATA (IN-MEMORY) ----------------
 
 NOTIFICATIONS = [
@@ -22,6 +28,107 @@ NOTIFICATIONS = [
 
 next_id = 2
 
+# ids por ordem de inserção, para procurar o after_id com bisect
+NOTIFICATION_IDS = [n["id"] for n in NOTIFICATIONS]
+
+# notificações agrupadas por order_id, para o filtro ?order_id=
+NOTIFICATIONS_BY_ORDER = {}
+for n in NOTIFICATIONS:
+    NOTIFICATIONS_BY_ORDER.setdefault(n["order_id"], []).append(n)
+
+# notificações por event_id: um evento reentregue (a outbox do orders é
+# at-least-once) devolve a notificação que já criou
+NOTIFICATIONS_BY_EVENT = {}
+
+# o id e a verificação do event_id têm de ser atómicos entre threads
+STORE_LOCK = threading.Lock()
+
+def add_notification(notification):
+    NOTIFICATIONS.append(notification)
+    NOTIFICATION_IDS.append(notification["id"])
+    NOTIFICATIONS_BY_ORDER.setdefault(notification["order_id"], []).append(notification)
+    if notification.get("event_id") is not None:
+        NOTIFICATIONS_BY_EVENT[notification["event_id"]] = notification
+
+# devolve (notificação, criada); com um event_id já visto não cria nada
+def store_notification(item):
+    global next_id
+
+    with STORE_LOCK:
+        event_id = item.get("event_id")
+        if event_id is not None and event_id in NOTIFICATIONS_BY_EVENT:
+            return NOTIFICATIONS_BY_EVENT[event_id], False
+
+        notification = {
+            "id": next_id,
+            "order_id": item.get("order_id"),
+            "message": item.get("message", "Notification created"),
+            "timestamp": item.get("timestamp", datetime.now().isoformat())
+        }
+        if event_id is not None:
+            notification["event_id"] = event_id
+
+        add_notification(notification)
+        next_id += 1
+        return notification, True
+
+def notification_time(notification):
+    try:
+        return datetime.fromisoformat(notification["timestamp"])
+    except (TypeError, ValueError):
+        return None
+
+# ---------------- PAGINATION ----------------
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        prefix, value = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if prefix != "id":
+            raise ValueError
+        return int(value)
+    except ValueError:
+        raise ValueError("invalid cursor")
+
+# os timestamps são guardados em hora local sem fuso (datetime.now()); um
+# since/until com offset passa para essa hora, para se poder comparar
+def naive_local(value):
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+def int_arg(args, name, default=None):
+    value = args.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+def parse_page_args(args):
+    if args.get("cursor"):
+        after_id = decode_cursor(args["cursor"])
+    else:
+        after_id = int_arg(args, "after_id", 0)
+
+    limit = int_arg(args, "limit", DEFAULT_PAGE_SIZE)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    try:
+        since = naive_local(datetime.fromisoformat(args["since"])) if args.get("since") else None
+        until = naive_local(datetime.fromisoformat(args["until"])) if args.get("until") else None
+    except ValueError:
+        raise ValueError("since/until must be ISO 8601 timestamps")
+
+    return after_id, limit, since, until
+
 # ---------------- APP ----------------
 
 app = Flask(__name__)
@@ -43,6 +150,15 @@ NOTIFICATIONS_REQUEST_LATENCY = Histogram(
     ["method", "endpoint"]
 )
 
+# ---------------- RESPONSES ----------------
+
+responses = ResponseLayer(app, "notifications")
+
+# ---------------- TRACING ----------------
+
+tracer = Tracer("notifications")
+tracer.instrument(app)
+
 # ---------------- MIDDLEWARE ----------------
 
 @app.before_request
@@ -52,16 +168,19 @@ def start_timer():
 @app.after_request
 def record_metrics(response):
     duration = time.perf_counter() - request.start_time
+    # a regra (p.ex. /orders/<int:order_id>) e não o path, para o número de séries
+    # não crescer com os ids
+    endpoint = request.url_rule.rule if request.url_rule else "__unmatched__"
 
     NOTIFICATIONS_REQUESTS_TOTAL.labels(
         method=request.method,
-        endpoint=request.path,
+        endpoint=endpoint,
         status=response.status_code
     ).inc()
 
     NOTIFICATIONS_REQUEST_LATENCY.labels(
         method=request.method,
-        endpoint=request.path
+        endpoint=endpoint
     ).observe(duration)
 
     return response
@@ -70,36 +189,124 @@ def record_metrics(response):
 
 @app.route("/notifications", methods=["GET"])
 def list_notifications():
+    try:
+        after_id, limit, since, until = parse_page_args(request.args)
+        order_id = int_arg(request.args, "order_id")
+    except ValueError as e:
+        return responses.json({"error": str(e)}), 400
+
     logger.info("Notifications list requested")
-    return jsonify({
+
+    # lista só com appends: o tamanho identifica a versão dos dados
+    last_id = NOTIFICATION_IDS[-1] if NOTIFICATION_IDS else 0
+    etag = make_etag("notifications", len(NOTIFICATIONS), last_id)
+    not_modified = responses.not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    if order_id is not None:
+        candidates = (
+            n for n in NOTIFICATIONS_BY_ORDER.get(order_id, []) if n["id"] > after_id
+        )
+    else:
+        candidates = (
+            NOTIFICATIONS[i]
+            for i in range(bisect.bisect_right(NOTIFICATION_IDS, after_id), len(NOTIFICATIONS))
+        )
+
+    page = []
+    has_more = False
+    for notification in candidates:
+        if since or until:
+            ts = notification_time(notification)
+            if ts is None or (since and ts < since) or (until and ts >= until):
+                continue
+        if len(page) == limit:
+            has_more = True
+            break
+        page.append(notification)
+
+    return responses.json({
         "service": "notifications",
-        "count": len(NOTIFICATIONS),
-        "data": NOTIFICATIONS
-    })
+        "count": len(page),
+        "next_cursor": encode_cursor(page[-1]["id"]) if has_more else None,
+        # maior id existente: ponto de partida para quem só quer os novos
+        "last_id": last_id,
+        "data": page
+    }, etag=etag)
+
+def validate_notification(item):
+    if not isinstance(item, dict):
+        return "notification must be an object"
+
+    order_id = item.get("order_id")
+    if order_id is not None and (isinstance(order_id, bool) or not isinstance(order_id, int)):
+        return "order_id must be an integer"
+    if not isinstance(item.get("message", ""), str):
+        return "message must be a string"
+
+    event_id = item.get("event_id")
+    if event_id is not None and not (isinstance(event_id, str) and 0 < len(event_id) <= 64):
+        return "event_id must be a string of at most 64 characters"
+    return None
 
 @app.route("/notifications", methods=["POST"])
 def create_notification():
-    global next_id
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    error = validate_notification(payload)
+    if error:
+        return responses.json({"error": error}), 400
 
-    payload = request.json or {}
+    notification, created = store_notification(payload)
+    if not created:
+        return responses.json(notification), 200
 
-    notification = {
-        "id": next_id,
-        "order_id": payload.get("order_id"),
-        "message": payload.get("message", "Notification created"),
-        "timestamp": payload.get("timestamp", datetime.now().isoformat())
-    }
+    logger.info(f"Notification created: {notification}")
 
-    NOTIFICATIONS.append(notification)
-    next_id += 1
+    return responses.json(notification), 201
 
-    logger.info(f"Notification created: {notification}")
+@app.route("/notifications/bulk", methods=["POST"])
+def create_notifications_bulk():
+    payload = request.get_json(silent=True)
+    items = payload.get("notifications") if isinstance(payload, dict) else payload
+
+    if not isinstance(items, list) or not items:
+        return responses.json({"error": "expected a non-empty list of notifications"}), 400
 
-    return jsonify(notification), 201
+    results = [None] * len(items)
+    created = 0
+    duplicates = 0
+    for i, item in enumerate(items):
+        error = validate_notification(item)
+        if error:
+            results[i] = {"index": i, "status": 400, "error": error}
+            continue
+
+        if store_notification(item)[1]:
+            results[i] = {"index": i, "status": 201}
+            created += 1
+        else:
+            results[i] = {"index": i, "status": 200, "duplicate": True}
+            duplicates += 1
+
+    logger.info(f"Bulk notifications created: {created}")
+
+    failed = len(items) - created - duplicates
+    status = 201 if not failed else (207 if created or duplicates else 400)
+
+    return responses.json({
+        "service": "notifications",
+        "created": created,
+        "duplicates": duplicates,
+        "failed": failed,
+        "results": results
+    }), status
 
 @app.route("/health")
 def health():
-    return jsonify({"status": "healthy"})
+    return responses.json({"status": "healthy"})
 
 @app.route("/metrics")
 def metrics():
@@ -0,0 +1,147 @@
+# Caminho ORM (como estava) vs SQLAlchemy Core nos endpoints quentes do
+# orders, com a tabela a 10k, 100k e 1M linhas.
+#
+#   page   - só a página: query keyset de 1000 linhas + dicts + orjson
+#   list   - GET /orders?limit=1000 completo, com a versão do ETag (count/max
+#            no caminho ORM antigo, collection_versions no atual)
+#   insert - POST /orders (ORM add/commit/refresh vs INSERT ... RETURNING)
+#
+# Por omissão usa uma base de dados sqlite temporária; com DATABASE_URL mede
+# contra o Postgres. O relay da outbox fica parado.
+#
+# Uso: python benchmarks/bench_core_vs_orm.py [tamanhos] [repetições]
+#   ex: python benchmarks/bench_core_vs_orm.py 10000,100000,1000000 200
+
+from datetime import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+SIZES = [int(n) for n in (sys.argv[1] if len(sys.argv) > 1 else "10000,100000,1000000").split(",")]
+REPEAT = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+PAGE = 1000
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/orders.db"
+os.environ["OUTBOX_POLL_INTERVAL"] = "3600"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import orjson  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+
+import app as orders  # noqa: E402
+from app import Order, OutboxEvent, SessionLocal  # noqa: E402
+
+orders.logger.setLevel("WARNING")
+orders.outbox_wakeup = threading.Event()
+
+# ---------------- CAMINHO ORM (ANTERIOR) ----------------
+
+def orm_page(after_id):
+    db = SessionLocal()
+    rows = db.query(Order).filter(Order.id > after_id).order_by(Order.id).limit(PAGE + 1).all()
+    db.close()
+    return orjson.dumps([
+        {"id": o.id, "product": o.product, "price": o.price, "timestamp": o.timestamp}
+        for o in rows[:PAGE]
+    ])
+
+
+@orders.app.route("/bench/orm/orders", methods=["GET"])
+def orm_list():
+    after_id = orders.request.args.get("after_id", 0, type=int)
+    db = SessionLocal()
+    total, last_id = db.query(func.count(Order.id), func.coalesce(func.max(Order.id), 0)).one()
+    rows = db.query(Order).filter(Order.id > after_id).order_by(Order.id).limit(PAGE + 1).all()
+    db.close()
+    return orders.responses.json({
+        "service": "orders",
+        "count": len(rows[:PAGE]),
+        "next_cursor": orders.encode_cursor(rows[PAGE - 1].id) if len(rows) > PAGE else None,
+        "last_id": last_id,
+        "data": [
+            {"id": o.id, "product": o.product, "price": o.price, "timestamp": o.timestamp}
+            for o in rows[:PAGE]
+        ]
+    }, etag=orders.make_etag("orders", total, last_id))
+
+
+@orders.app.route("/bench/orm/orders", methods=["POST"])
+def orm_create():
+    payload = orders.request.json or {}
+    db = SessionLocal()
+    now = datetime.now()
+    order = Order(product=payload.get("product", "Unknown"), price=payload.get("price", 0), timestamp=now)
+    db.add(order)
+    db.flush()
+    db.execute(insert(OutboxEvent), orders.outbox_events(order.id, order.price, now))
+    db.commit()
+    db.refresh(order)
+    db.close()
+    return orders.responses.json(orders.order_json(order)), 201
+
+# ---------------- CAMINHO CORE ----------------
+
+def core_page(after_id):
+    with orders.engine.connect() as conn:
+        rows = conn.execute(
+            orders.orders_page_query(False, False),
+            {"after_id": after_id, "limit": PAGE + 1}
+        ).all()
+    return orjson.dumps([dict(zip(orders.ORDER_COLUMNS, row)) for row in rows[:PAGE]])
+
+# ---------------- MEDIÇÃO ----------------
+
+def timed(call, args):
+    latencies = []
+    for a in args:
+        start = time.perf_counter()
+        call(a)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2], sum(latencies)
+
+
+def seed(up_to):
+    current = orders.engine.connect().execute(orders.ORDERS_VERSION).one()[1]
+    now = datetime.now()
+    with orders.engine.begin() as conn:
+        for start in range(current, up_to, 50000):
+            conn.execute(insert(orders.orders_table), [
+                {"product": f"Product {i}", "price": 9.99 + i, "timestamp": now}
+                for i in range(start, min(up_to, start + 50000))
+            ])
+
+
+def report(name, orm, core, unit):
+    (orm_p50, _), (core_p50, _) = orm, core
+    print(f"  {name:7} orm {orm_p50 * 1000:8.2f} ms  core {core_p50 * 1000:8.2f} ms  {orm_p50 / core_p50:5.2f}x  ({unit})")
+
+
+if __name__ == "__main__":
+    http = orders.app.test_client()
+    print(f"{orders.engine.url.drivername}, página de {PAGE} linhas, {REPEAT} repetições (p50)")
+
+    for size in SIZES:
+        seed(size)
+        starts = [random.randrange(0, max(1, size - PAGE)) for _ in range(REPEAT)]
+        print(f"{size} linhas")
+
+        report("page", timed(orm_page, starts), timed(core_page, starts), "por página")
+        report(
+            "list",
+            timed(lambda a: http.get(f"/bench/orm/orders?after_id={a}"), starts),
+            timed(lambda a: http.get(f"/orders?after_id={a}&limit={PAGE}"), starts),
+            "por pedido"
+        )
+        body = {"product": "bench", "price": 1.5}
+        report(
+            "insert",
+            timed(lambda _: http.post("/bench/orm/orders", json=body), range(REPEAT)),
+            timed(lambda _: http.post("/orders", json=body), range(REPEAT)),
+            "por pedido"
+        )
@@ -0,0 +1,85 @@
+# POST /orders por segundo com e sem group commit.
+#
+# Corre o serviço orders no próprio processo (cliente de teste do Flask) com
+# vários clientes concorrentes:
+#   off   - uma transação, um commit e um refresh por order
+#   group - GroupCommitter: orders concorrentes partilham INSERT ... RETURNING
+#           e commit
+#
+# Por omissão usa uma base de dados sqlite temporária; com DATABASE_URL mede
+# contra o Postgres. O relay da outbox fica parado para medir só a escrita.
+#
+# Uso: python benchmarks/bench_group_commit.py [orders] [concorrência]
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+N_ORDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+CONCURRENCY = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/orders.db"
+os.environ["OUTBOX_POLL_INTERVAL"] = "3600"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import app as orders  # noqa: E402
+
+orders.logger.setLevel("WARNING")
+orders.outbox_wakeup = threading.Event()
+
+
+def run(name):
+    latencies = []
+    counter = iter(range(N_ORDERS))
+    lock = threading.Lock()
+
+    def client():
+        http = orders.app.test_client()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            r = http.post("/orders", json={"product": f"Product {i}", "price": i})
+            assert r.status_code == 201, r.status_code
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(CONCURRENCY)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(
+        f"{name:6} {N_ORDERS / elapsed:8.0f} orders/s  "
+        f"p50 {latencies[len(latencies) // 2] * 1000:7.2f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms"
+    )
+
+
+def histogram_mean(histogram):
+    samples = {s.name: s.value for s in histogram.collect()[0].samples}
+    name = histogram.collect()[0].name
+    return samples[f"{name}_sum"] / max(1, samples[f"{name}_count"])
+
+
+if __name__ == "__main__":
+    print(f"{N_ORDERS} orders, concorrência {CONCURRENCY}, {orders.engine.url.drivername}")
+
+    orders.group_committer = None
+    run("off")
+
+    orders.group_committer = orders.GroupCommitter()
+    run("group")
+    print(
+        f"       lote médio {histogram_mean(orders.ORDERS_GROUP_COMMIT_BATCH):.1f} orders, "
+        f"espera média {histogram_mean(orders.ORDERS_GROUP_COMMIT_WAIT) * 1000:.2f} ms"
+    )
@@ -0,0 +1,85 @@
+# POST /orders por segundo, sem group commit, consoante a forma como cada
+# insert incrementa a versão da coleção (base do ETag das listas):
+#
+#   none    - sem incremento (referência: o custo do próprio insert)
+#   single  - uma só linha em collection_versions (VERSION_SHARDS=1)
+#   sharded - VERSION_SHARDS linhas, uma ao acaso por insert
+#
+# O lock da linha incrementada dura até ao commit, fsync incluído; com uma
+# só linha os inserts concorrentes ficam em fila atrás dele. Só faz sentido
+# contra o Postgres (o sqlite serializa as escritas de qualquer forma).
+#
+# Os modos alternam em várias rondas, depois de um aquecimento, e cada um
+# mostra a mediana: medições seguidas do mesmo modo variam muito.
+#
+# Uso: DATABASE_URL=postgresql://... python benchmarks/bench_version_bump.py [orders] [concorrências] [rondas]
+#   ex: python benchmarks/bench_version_bump.py 2000 1,8,32 5
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+N_ORDERS = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+CONCURRENCY = [int(c) for c in (sys.argv[2] if len(sys.argv) > 2 else "1,8,32").split(",")]
+ROUNDS = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/orders.db"
+os.environ["OUTBOX_POLL_INTERVAL"] = "3600"
+os.environ["GROUP_COMMIT"] = "0"
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import app as orders  # noqa: E402
+
+orders.logger.setLevel("WARNING")
+orders.outbox_wakeup = threading.Event()
+
+SHARDS = orders.VERSION_SHARDS
+bump_version = orders.bump_version
+
+
+def run(name, concurrency):
+    counter = iter(range(N_ORDERS))
+    lock = threading.Lock()
+
+    def client():
+        http = orders.app.test_client()
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            r = http.post("/orders", json={"product": f"Product {i}", "price": i})
+            assert r.status_code == 201, r.status_code
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return N_ORDERS / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    print(f"{N_ORDERS} orders por medição, {orders.engine.url.drivername}, VERSION_SHARDS={SHARDS}")
+
+    modes = (
+        ("none", lambda conn: None, SHARDS),
+        ("single", bump_version, 1),
+        ("sharded", bump_version, SHARDS),
+    )
+    run("warmup", max(CONCURRENCY))
+    for concurrency in CONCURRENCY:
+        rates = {name: [] for name, _, _ in modes}
+        for _ in range(ROUNDS):
+            for name, bump, shards in modes:
+                orders.bump_version = bump
+                orders.VERSION_SHARDS = shards
+                rates[name].append(run(name, concurrency))
+        print(f"  {concurrency:3} clientes  " + "  ".join(
+            f"{name} {sorted(r)[len(r) // 2]:7.0f}/s" for name, r in rates.items()
+        ))
@@ -0,0 +1,187 @@
+from flask import Response, request
+from prometheus_client import Histogram
+from datetime import datetime
+import csv
+import gzip
+import io
+import os
+import time
+
+import orjson
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ---------------- CONFIG ----------------
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+# ---------------- ENCODING ----------------
+
+def accepted_encodings(header: str) -> dict:
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    return accepted
+
+def choose_encoding(header: str):
+    accepted = accepted_encodings(header or "")
+    wildcard = accepted.get("*", 0)
+
+    if brotli is not None and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+# ---------------- ETAGS ----------------
+
+# ETags fracas: o mesmo recurso pode ser enviado com ou sem compressão.
+def make_etag(*parts) -> str:
+    return 'W/"' + "-".join(str(p) for p in parts) + '"'
+
+def etag_matches(header: str, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in header.split(",")
+    )
+
+# ---------------- EXPORT ----------------
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# ?format=ndjson|csv, ou Accept: text/csv; por omissão NDJSON
+def export_format() -> str:
+    fmt = request.args.get("format")
+    if not fmt:
+        fmt = "csv" if "text/csv" in request.headers.get("Accept", "") else "ndjson"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+def csv_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+# ---------------- RESPONSES ----------------
+
+# JSON com orjson (datetimes serializados diretamente, sem isoformat() por
+# linha) e compressão gzip/brotli negociada pelo Accept-Encoding.
+class ResponseLayer:
+    def __init__(self, app, service: str):
+        self.encode_latency = Histogram(
+            f"{service}_response_encode_seconds",
+            f"Tempo de serialização JSON das respostas do serviço {service.capitalize()}"
+        )
+        self.compress_latency = Histogram(
+            f"{service}_response_compress_seconds",
+            f"Tempo de compressão das respostas do serviço {service.capitalize()}",
+            ["encoding"]
+        )
+        app.after_request(self.compress)
+
+    def json(self, payload, status: int = 200, etag: str = None) -> Response:
+        start = time.perf_counter()
+        body = orjson.dumps(payload)
+        self.encode_latency.observe(time.perf_counter() - start)
+
+        response = Response(body, status=status, mimetype="application/json")
+        if etag:
+            response.headers["ETag"] = etag
+        return response
+
+    # 304 sem corpo quando o If-None-Match do cliente ainda é válido;
+    # None para o handler seguir com a query normal.
+    def not_modified(self, etag: str):
+        if not etag_matches(request.headers.get("If-None-Match"), etag):
+            return None
+
+        response = Response(status=304)
+        response.headers["ETag"] = etag
+        return response
+
+    # Resposta em streaming a partir de lotes de linhas (tuplos pela ordem de
+    # columns), um chunk por lote: a memória não depende do total de linhas.
+    # Hoje só o orders e o payments exportam; fica aqui porque este ficheiro é
+    # o mesmo em todos os serviços, de propósito (alterar sempre as cinco cópias).
+    def export(self, columns, partitions, fmt: str, filename: str) -> Response:
+        def generate():
+            try:
+                if fmt == "csv":
+                    buffer = io.StringIO()
+                    writer = csv.writer(buffer)
+                    writer.writerow(columns)
+                    # o cabeçalho sai logo, mesmo que não haja linhas
+                    yield buffer.getvalue().encode()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    for rows in partitions:
+                        writer.writerows([csv_value(v) for v in row] for row in rows)
+                        yield buffer.getvalue().encode()
+                        buffer.seek(0)
+                        buffer.truncate()
+                else:
+                    for rows in partitions:
+                        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+            finally:
+                # cliente desligado a meio: fecha já o cursor do lado do servidor
+                close = getattr(partitions, "close", None)
+                if close is not None:
+                    close()
+
+        return Response(
+            generate(),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+        )
+
+    def compress(self, response: Response) -> Response:
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_SIZE:
+            return response
+
+        encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+        if encoding is None:
+            return response
+
+        start = time.perf_counter()
+        if encoding == "br":
+            body = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        self.compress_latency.labels(encoding=encoding).observe(time.perf_counter() - start)
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
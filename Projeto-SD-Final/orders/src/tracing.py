@@ -0,0 +1,241 @@
+from flask import g, request
+from prometheus_client import Counter
+import atexit
+import contextvars
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+import orjson
+
+# ---------------- CONFIG ----------------
+
+# Sem TRACE_EXPORT_FILE nem TRACE_COLLECTOR_URL os spans não são exportados,
+# mas o traceparent continua a ser propagado.
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "512"))
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", "1.0"))
+
+logger = logging.getLogger("tracing")
+
+CURRENT_SPAN = contextvars.ContextVar("current_span", default=None)
+
+# ---------------- TRACEPARENT ----------------
+
+# W3C trace context: 00-<trace_id 32 hex>-<parent_id 16 hex>-<flags>
+def parse_traceparent(header: str):
+    if not header:
+        return None
+
+    parts = header.strip().split("-")
+    if len(parts) < 4 or parts[0] == "ff" or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        if int(parts[1], 16) == 0 or int(parts[2], 16) == 0:
+            return None
+    except ValueError:
+        return None
+    return parts[1].lower(), parts[2].lower(), bool(flags & 1)
+
+# ---------------- SPANS ----------------
+
+class Span:
+    __slots__ = (
+        "tracer", "name", "kind", "trace_id", "span_id", "parent_id",
+        "sampled", "start_ns", "attributes", "error", "_token"
+    )
+
+    def __init__(self, tracer, name, kind, trace_id, parent_id, sampled, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.attributes = attributes or {}
+        self.error = None
+        self._token = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def activate(self):
+        self._token = CURRENT_SPAN.set(self)
+
+    def end(self):
+        if self._token is not None:
+            CURRENT_SPAN.reset(self._token)
+            self._token = None
+        if self.sampled and self.tracer.enabled:
+            self.tracer.export(self, time.time_ns())
+
+    def __enter__(self):
+        self.activate()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+# ---------------- TRACER ----------------
+
+# Os spans terminados vão para uma fila limitada e uma thread exporta-os em
+# lotes (JSON Zipkin v2, uma linha por span no ficheiro ou POST ao
+# collector), para o pedido só pagar a criação do span e um put_nowait.
+class Tracer:
+    def __init__(self, service: str):
+        self.service = service
+        self.enabled = bool(TRACE_EXPORT_FILE or TRACE_COLLECTOR_URL)
+
+        self.exported = Counter(
+            f"{service}_trace_spans_exported_total",
+            f"Spans exportados pelo serviço {service.capitalize()}"
+        )
+        self.dropped = Counter(
+            f"{service}_trace_spans_dropped_total",
+            f"Spans descartados pelo serviço {service.capitalize()} (fila cheia ou erro de exportação)"
+        )
+
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        if self.enabled:
+            threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+            atexit.register(self.flush)
+
+    def start_span(self, name: str, kind: str = None, parent=None, attributes=None) -> Span:
+        if parent is None:
+            parent = CURRENT_SPAN.get()
+
+        if isinstance(parent, Span):
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id = f"{random.getrandbits(128):032x}"
+            parent_id = None
+            sampled = random.random() < TRACE_SAMPLE_RATE
+
+        return Span(self, name, kind, trace_id, parent_id, sampled, attributes)
+
+    def span(self, name: str, kind: str = None, attributes=None) -> Span:
+        return self.start_span(name, kind=kind, attributes=attributes)
+
+    def inject(self, headers: dict = None) -> dict:
+        headers = {} if headers is None else headers
+        current = CURRENT_SPAN.get()
+        if current is not None:
+            headers["traceparent"] = current.traceparent()
+        return headers
+
+    # span SERVER por pedido, filho do traceparent recebido
+    def instrument(self, app):
+        @app.before_request
+        def start_trace():
+            span = self.start_span(
+                f"{request.method} {request.url_rule.rule if request.url_rule else request.path}",
+                kind="SERVER",
+                parent=parse_traceparent(request.headers.get("traceparent")),
+                attributes={"http.method": request.method, "http.path": request.path},
+            )
+            span.activate()
+            g.trace_span = span
+
+        @app.after_request
+        def record_status(response):
+            span = g.get("trace_span")
+            if span is not None:
+                span.set("http.status_code", response.status_code)
+            return response
+
+        @app.teardown_request
+        def end_trace(exc):
+            span = g.pop("trace_span", None)
+            if span is None:
+                return
+            if exc is not None:
+                span.error = f"{type(exc).__name__}: {exc}"
+            span.end()
+
+    # ---------------- EXPORT ----------------
+
+    def export(self, span: Span, end_ns: int):
+        try:
+            self._queue.put_nowait((span, end_ns))
+        except queue.Full:
+            self.dropped.inc()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + TRACE_EXPORT_INTERVAL
+            while len(batch) < TRACE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._write(batch)
+
+    def _zipkin(self, span: Span, end_ns: int) -> dict:
+        data = {
+            "traceId": span.trace_id,
+            "id": span.span_id,
+            "name": span.name,
+            "timestamp": span.start_ns // 1000,
+            "duration": max(1, (end_ns - span.start_ns) // 1000),
+            "localEndpoint": {"serviceName": self.service},
+            "tags": {k: str(v) for k, v in span.attributes.items()},
+        }
+        if span.parent_id:
+            data["parentId"] = span.parent_id
+        if span.kind:
+            data["kind"] = span.kind
+        if span.error:
+            data["tags"]["error"] = span.error
+        return data
+
+    def _write(self, batch):
+        spans = [self._zipkin(span, end_ns) for span, end_ns in batch]
+        try:
+            with self._lock:
+                if TRACE_EXPORT_FILE:
+                    with open(TRACE_EXPORT_FILE, "ab") as f:
+                        f.write(b"".join(orjson.dumps(s) + b"\n" for s in spans))
+                if TRACE_COLLECTOR_URL:
+                    req = urllib.request.Request(
+                        TRACE_COLLECTOR_URL,
+                        data=orjson.dumps(spans),
+                        headers={"Content-Type": "application/json"},
+                        method="POST",
+                    )
+                    urllib.request.urlopen(req, timeout=2).close()
+            self.exported.inc(len(spans))
+        except Exception as e:
+            logger.warning(f"Failed to export {len(spans)} spans: {e}")
+            self.dropped.inc(len(spans))